@@ -0,0 +1,291 @@
+# Can each level actually be finished, and how fast?
+# Searches the player's possible inputs with the real game physics, holding each input for a few frames at a time and
+# going back to saved states (see Game.snapshot) to try the next input. It's a best first search: whatever's been
+# played for the fewest frames plus (--greed times) the fewest it could still take to get to the goal is tried next,
+# and anything that ends up somewhere that's already been reached is skipped. By default that's almost all just
+# heading for the goal, which gets through every level in seconds but not always the fastest way (try --greed 1 with
+# a bigger --hold for that). The way through each level it finds is then played back once more with everything being drawn to see how long its frames take
+# Levels are searched in parallel in a pool of processes, and with --split so are the first few inputs of each level
+#   python analyze.py
+#   python analyze.py --levels 4 5 --hold 4 --recordings paths
+# with --recordings, each path is saved as a recording that replay.py can play
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+import argparse
+import heapq
+import itertools
+import math
+import multiprocessing
+import time
+import pygame as pg
+from settings import *
+from controls import KEY_BITS
+from game import Game, DIED, FINISHED
+from components import Enemy, SlidingBrick
+from replay import Recording
+from sim import headless_game
+
+LEFT = KEY_BITS[pg.K_LEFT]
+RIGHT = KEY_BITS[pg.K_RIGHT]
+JUMP = KEY_BITS[pg.K_SPACE]
+# pressing left and right at once is the same as pressing neither
+ACTIONS = (0, LEFT, RIGHT, JUMP, LEFT|JUMP, RIGHT|JUMP)
+
+# things that walk back and forth on their own
+# they never stop, so two states reached at different times would never match if we kept exactly where they were
+PATROLLING = (Enemy, SlidingBrick)
+# how far from the player (in bricks) a sliding brick has to be before it stops mattering where it is
+NEARBY = 5
+# what the player can't go through on the way to the goal, and what they can stand on, as far as guessing how far
+# away it is goes (see goal_distances)
+WALLS = "H#*"
+FLOORS = "H#="
+# how many bricks higher than where they're standing the player can jump
+JUMP_BRICKS = 3
+# the fastest the player can run, in pixels per step (where friction cancels out running)
+TOP_SPEED = PLAYER_SPEED/MOVING_FRICT
+
+# what counts as being in the same place: the player to within cell pixels and speed pixels per step, and whether
+# they can still jump, plus whatever else decides where they can get to from here
+# things the player can push around are kept to within cell pixels too, and sliding bricks near the player only as
+# which brick they're in and which way they're going (how far along their patrol they are)
+# anything else patrolling is left out, sliding bricks further away since they'll have moved on by the time we get
+# there, and enemies since keeping them makes almost every state different and the search never gets anywhere (an
+# enemy that's in the way just kills the paths that run into it), and so is anything that's gone (eg. a dead enemy)
+def state_key(game, cell, speed):
+    player = game.player
+    rect = player.rect
+    near = rect.inflate(NEARBY*2*BRICK_W, NEARBY*2*BRICK_H)
+    world = []
+    for item in game.world:
+        if item.remove:
+            continue
+        if type(item) in PATROLLING:
+            if type(item) is SlidingBrick and near.colliderect(item.rect):
+                world.append((int(item.rect.x//BRICK_W), int(item.rect.y//BRICK_H), item.vel[0] > 0))
+        else:
+            world.append((item.rect.x//cell, item.rect.y//cell))
+    return (rect.x//cell, rect.y//cell, player.vel[0]//speed, player.vel[1]//speed, player.on_ground,
+        player.jumping, player.last_on_ground < COYOTE, player.last_on_ground < LONG_JUMP, tuple(world),
+    )
+
+# how many bricks from the goal every brick in level is for the player's feet, going around walls (and lava), or None
+# if there's no goal
+# it's only a guess at how far the player has to go: they can go sideways or down anywhere, but only up within
+# JUMP_BRICKS of the top of something to stand on (anything solid, or anywhere a sliding brick goes)
+def goal_distances(level):
+    layout = LEVELS[level-1]
+    rows = len(layout)
+    columns = len(layout[0])
+    goals = [(x, y) for y, row in enumerate(layout) for x, char in enumerate(row) if char == "O"]
+    if not goals:
+        return None
+    standable = [[char in FLOORS for char in row] for row in layout]
+    for y, row in enumerate(layout):
+        # sliding bricks go anywhere between the bouncers either side of them
+        for x, char in enumerate(row):
+            if char == "-":
+                left = row.rfind("|", 0, x)
+                right = row.find("|", x)
+                for track in range(left+1, right if right >= 0 else columns):
+                    standable[y][track] = True
+    # only the tops of things count, not eg. the side of a wall
+    for y in range(rows-1, 0, -1):
+        for x in range(columns):
+            if standable[y-1][x]:
+                standable[y][x] = False
+    def can_climb(x, y):
+        return any(
+            standable[below][column]
+            for below in range(y+1, min(y+1+JUMP_BRICKS, rows))
+            for column in range(max(x-1, 0), min(x+2, columns))
+        )
+    # we're going backwards from the goal, so these are the moves that get to x, y
+    distances = [[math.inf]*columns for _ in range(rows)]
+    queue = []
+    for x, y in goals:
+        distances[y][x] = 0
+        queue.append((0, x, y))
+    while queue:
+        distance, x, y = heapq.heappop(queue)
+        if distance > distances[y][x]:
+            continue
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)):
+            # from x+dx, y+dy to x, y, which is going up if dy is 1
+            nx = x+dx
+            ny = y+dy
+            if not (0 <= ny < rows and 0 <= nx < columns) or layout[ny][nx] in WALLS:
+                continue
+            if dy == 1 and not can_climb(nx, ny):
+                continue
+            new = distance+math.hypot(dx, dy)
+            if new < distances[ny][nx]:
+                distances[ny][nx] = new
+                heapq.heappush(queue, (new, nx, ny))
+    return distances
+
+# the fewest steps it could take the player to get to the goal from where they are, if they ran straight there
+def steps_left(game, distances):
+    rect = game.player.rect
+    row = distances[min(max(int((rect.bottom-1)//BRICK_H), 0), len(distances)-1)]
+    distance = row[min(max(int(rect.centerx//BRICK_W), 0), len(row)-1)]
+    if distance == math.inf:
+        # somewhere we don't think the player can get to the goal from, eg. stood on an enemy
+        distance = len(row)+len(distances)
+    return distance*BRICK_W/TOP_SPEED
+
+# The result of searching one level (or one part of it)
+# frames: the actions for every frame of the way to the goal we found, or None if we didn't find one
+# explored: how many states we looked at
+# exhausted: whether we ran out of places to go before max_frames or max_states
+# (even then not finding a way doesn't mean there isn't one, since states that are only nearly the same are skipped,
+# so the only levels we can say can't be finished are ones with no goal)
+class Result:
+    def __init__(self, level, frames, explored, exhausted):
+        self.level = level
+        self.frames = frames
+        self.explored = explored
+        self.exhausted = exhausted
+
+# every action in a path, which is kept as (action, frames held, the path before it) so paths can share their starts
+def unpack_path(path):
+    frames = []
+    while path is not None:
+        action, count, path = path
+        frames.extend([action]*count)
+    frames.reverse()
+    return frames
+
+# best first search from the start of level, after playing prefix (actions held for hold frames each)
+# greed is how much more getting closer to the goal counts than how long it took, 1 finds the fastest way (as far as
+# skipping nearly the same states lets it), higher finds a way sooner
+def search(level, prefix, hold, cell, speed, greed, max_frames, max_states):
+    distances = goal_distances(level)
+    if distances is None:
+        return Result(level, None, 0, True)
+    game = headless_game(level)
+    path = None
+    frames = 0
+    for action in prefix:
+        for _ in range(hold):
+            path = (action, 1, path)
+            frames += 1
+            event = game.step(action)
+            if event == FINISHED:
+                return Result(level, unpack_path(path), 0, True)
+            if event == DIED:
+                return Result(level, None, 0, True)
+    # the counter keeps states that are as good as each other in the order they were found, and stops heapq ever
+    # comparing snapshots
+    order = itertools.count()
+    frontier = [(frames+greed*steps_left(game, distances), next(order), frames, game.snapshot(), path)]
+    seen = {state_key(game, cell, speed)}
+    explored = 0
+    while frontier:
+        _, _, frames, snapshot, path = heapq.heappop(frontier)
+        if frames >= max_frames:
+            continue
+        for action in ACTIONS:
+            if explored == max_states:
+                return Result(level, None, explored, False)
+            game.restore(snapshot)
+            explored += 1
+            count = 0
+            for _ in range(hold):
+                count += 1
+                event = game.step(action)
+                if event:
+                    break
+            new_path = (action, count, path)
+            if event == FINISHED:
+                return Result(level, unpack_path(new_path), explored, True)
+            if event == DIED:
+                continue
+            new_frames = frames+count
+            key = state_key(game, cell, speed)
+            if key in seen:
+                continue
+            seen.add(key)
+            heapq.heappush(frontier, (new_frames+greed*steps_left(game, distances), next(order), new_frames, game.snapshot(), new_path))
+    return Result(level, None, explored, True)
+
+def run_search(args):
+    return search(*args)
+
+# play frames on level like someone was actually playing, drawing every one
+# returns how long each frame took in milliseconds, and the game and a recording of it
+def time_path(screen, level, frames):
+    game = Game(screen, pg.time.Clock(), level)
+    recording = Recording(level)
+    game.recorder = recording
+    times = []
+    for action in frames:
+        start = time.perf_counter()
+        if not game.step(action):
+            game.render()
+        times.append((time.perf_counter()-start)*1000)
+    return times, game, recording
+
+def main():
+    parser = argparse.ArgumentParser(description="Find out whether each level can be finished and how fast, by searching every input")
+    parser.add_argument("--levels", type=int, nargs="*", default=list(range(1, len(LEVELS)+1)))
+    parser.add_argument("--hold", type=int, default=8, help="frames to hold each input for (smaller is slower but finds faster paths)")
+    parser.add_argument("--cell", type=int, default=25, help="positions this many pixels apart count as the same")
+    parser.add_argument("--speed", type=float, default=6, help="player speeds this many pixels per step apart count as the same")
+    parser.add_argument("--greed", type=float, default=1000, help="how much more getting closer to the goal counts than the frames it took (1 finds the fastest way but can take far longer)")
+    parser.add_argument("--seconds", type=float, default=60, help="give up on paths longer than this")
+    parser.add_argument("--max-states", type=int, default=200000, help="give up after looking at this many states (in each part of a level, see --split)")
+    parser.add_argument("--split", type=int, default=0, help="search each level as 6^split separate parts, for when there are more cpus than levels")
+    parser.add_argument("--workers", type=int, default=None, help="processes to search with (default: one per cpu)")
+    parser.add_argument("--recordings", help="save the path found for each level here as a recording for replay.py")
+    args = parser.parse_args()
+
+    max_frames = round(args.seconds*PHYSICS_FPS)
+    tasks = [
+        (level, prefix, args.hold, args.cell, args.speed, args.greed, max_frames, args.max_states)
+        for level in args.levels
+        for prefix in itertools.product(ACTIONS, repeat=args.split)
+    ]
+    start = time.perf_counter()
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+    else:
+        context = multiprocessing.get_context()
+    with context.Pool(args.workers) as pool:
+        results = pool.map(run_search, tasks, chunksize=1)
+    elapsed = time.perf_counter()-start
+
+    # put the parts of each level back together
+    levels = {}
+    for result in results:
+        level = levels.setdefault(result.level, Result(result.level, None, 0, True))
+        level.explored += result.explored
+        if result.frames is not None and (level.frames is None or len(result.frames) < len(level.frames)):
+            level.frames = result.frames
+        if result.frames is None and not result.exhausted:
+            level.exhausted = False
+
+    pg.display.init()
+    screen = pg.display.set_mode((WIDTH, HEIGHT))
+    if args.recordings:
+        os.makedirs(args.recordings, exist_ok=True)
+    print(f"{'level':>5} {'finished':>9} {'frames':>7} {'seconds':>8} {'states':>8} {'path ms':>8} {'worst ms':>8}")
+    for level in args.levels:
+        result = levels[level]
+        if result.frames is None:
+            # the search skips states that are only nearly the same, so it not finding a way proves nothing unless
+            # there's nowhere to get to
+            finished = "no" if goal_distances(level) is None else "not found"
+            print(f"{level:>5} {finished:>9} {'-':>7} {'-':>8} {result.explored:>8} {'-':>8} {'-':>8}")
+            continue
+        times, game, recording = time_path(screen, level, result.frames)
+        if args.recordings:
+            recording.save(os.path.join(args.recordings, f"level{level}.rec"), game)
+        frames = len(result.frames)
+        print(f"{level:>5} {'yes':>9} {frames:>7} {frames/PHYSICS_FPS:>8.2f} {result.explored:>8} {sum(times):>8.1f} {max(times):>8.2f}")
+    pg.quit()
+    print(f"searched in {elapsed:.1f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import threading
+import pygame as pg
+from pathlib import Path
+from settings import SPRITES, SPRITE_DIR, TEXT_CACHE_SIZE
+from cache import LRUCache
+
+# Sprites are loaded the first time something asks for them instead of all at once at startup
+# and converted to the display's pixel format, otherwise every blit has to convert them on the fly
+
+# name -> the frames listed for it in SPRITES, at their original size
+loaded = {}
+def load_sprites(name):
+    if name not in loaded:
+        frames = []
+        for path in SPRITES[name]:
+            sprite = pg.image.load(Path(SPRITE_DIR, path))
+            # converting needs a display mode, which we don't have if nothing's been opened yet
+            if pg.display.get_surface() is not None:
+                sprite = sprite.convert_alpha()
+            frames.append(sprite)
+        loaded[name] = frames
+    return loaded[name]
+
+# (name, size) -> the frames scaled to size
+# they're all scaled straight into one atlas surface side by side and handed out as subsurfaces of it,
+# so every entity of the same kind and size shares the same frames
+# sizes are on screen sizes, so Game.resize clears this, otherwise every window size would add more
+atlases = {}
+def sprite_frames(name, size):
+    key = (name, size)
+    if key not in atlases:
+        sprites = load_sprites(name)
+        width, height = size
+        # same pixel format as the sprites so they can be scaled right into it
+        atlas = pg.Surface((width*len(sprites), height), sprites[0].get_flags(), sprites[0])
+        frames = []
+        for i, sprite in enumerate(sprites):
+            frame = atlas.subsurface((width*i, 0, width, height))
+            pg.transform.scale(sprite, size, frame)
+            frames.append(frame)
+        atlases[key] = frames
+    return atlases[key]
+
+# pg.font.SysFont looks through every font on the system the first time it's used, which is really slow on some machines
+# so fonts are loaded on a background thread and the game just draws without text until they're ready
+# sizes is {name: size} for each font we want from family
+# if pg.font isn't running (eg. games simulated without a screen in sim.py) nothing's loaded and they're never ready
+class Fonts:
+    def __init__(self, family, sizes):
+        self.fonts = None
+        self.thread = None
+        if pg.font.get_init():
+            self.thread = threading.Thread(target=self.load, args=(family, sizes), daemon=True)
+            self.thread.start()
+
+    def load(self, family, sizes):
+        self.fonts = {name: pg.font.SysFont(family, size) for name, size in sizes.items()}
+
+    def ready(self):
+        return self.fonts is not None
+
+    # wait until the fonts are loaded
+    def wait(self):
+        if self.thread is not None:
+            self.thread.join()
+
+    def get(self, name):
+        self.wait()
+        return self.fonts[name]
+
+# rendered text keyed by (font, text, color, antialias)
+# signs and the level number are the same every frame, so they only ever have to be rendered once
+# the debug overlay changes all the time, which is why it's bounded
+text_cache = LRUCache(TEXT_CACHE_SIZE)
+def render_text(font, text, color, antialias=True):
+    # Colors can't be hashed, so the key uses its (r, g, b, a) instead
+    return text_cache.get((font, text, tuple(color), antialias), lambda: font.render(text, antialias, color))
@@ -0,0 +1,265 @@
+# Headless benchmark: runs every level with scripted input as fast as possible and reports how long frames take
+# It uses SDL's dummy video driver so it works without a display, eg.
+#   python bench.py
+#   python bench.py --frames 2000 --levels 4 5 7
+#   python bench.py --script inputs.txt --json results.json
+#   python bench.py --stress 2000 --numpy
+#   python bench.py --tracemalloc
+#   python bench.py --startup
+#   python bench.py --wide 100
+#   python bench.py --trace trace.json
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+import argparse
+import gc
+import json
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+import pygame as pg
+from settings import *
+import components
+from game import Game, PROFILED
+from profiler import profiler
+from controls import Keys
+
+KEY_NAMES = {
+    "left": pg.K_LEFT,
+    "right": pg.K_RIGHT,
+    "space": pg.K_SPACE,
+}
+
+# every hold frames, press a random mix of left, right and space
+# the seed makes it the same every run
+def random_input(frames, seed, hold=20):
+    rng = random.Random(seed)
+    keys = Keys()
+    for frame in range(frames):
+        if frame % hold == 0:
+            keys = Keys(key for key in KEY_NAMES.values() if rng.random() < 0.45)
+        yield keys
+
+# a script is one line per step: how many frames to hold the keys for, then which keys
+#   30 right
+#   10 right space
+#   20
+# blank lines and lines starting with # are ignored, and the script repeats until frames runs out
+def script_input(path, frames):
+    steps = []
+    with open(path) as f:
+        for line in f:
+            words = line.split()
+            if not words or words[0].startswith("#"):
+                continue
+            steps.append((int(words[0]), Keys(KEY_NAMES[word] for word in words[1:])))
+    frame = 0
+    while frame < frames:
+        for count, keys in steps:
+            for _ in range(count):
+                if frame >= frames:
+                    return
+                yield keys
+                frame += 1
+
+# time spent in handle_collisions, so it can be split out of the update time
+collide_time = 0
+untimed_handle_collisions = components.Entity.handle_collisions
+def timed_handle_collisions(self, *args):
+    global collide_time
+    start = time.perf_counter()
+    untimed_handle_collisions(self, *args)
+    collide_time += time.perf_counter()-start
+components.Entity.handle_collisions = timed_handle_collisions
+
+def percentile(times, p):
+    times = sorted(times)
+    return times[round(p*(len(times)-1))]
+
+# a level screens screens wide, made by putting the insides of the real levels side by side
+# returns its level number
+def add_wide_level(screens):
+    rows = len(LEVELS[0])
+    layout = ["H"]*rows
+    for screen in range(screens):
+        source = LEVELS[screen%len(LEVELS)]
+        for y in range(rows):
+            # leave out the player, goal, score and signs, there's only one of each
+            layout[y] += "".join(" " if char in "@OUS" else char for char in source[y][1:-1])
+    layout = [row+"H" for row in layout]
+    layout[1] = layout[1][:14]+"U"+layout[1][15:]
+    layout[rows-5] = layout[rows-5][:3]+"@"+layout[rows-5][4:]
+    layout[rows-2] = layout[rows-2][:-3]+"O"+layout[rows-2][-2:]
+    LEVELS.append(layout)
+    LEVEL_SIGNS.append([])
+    return len(LEVELS)
+
+# drop count boxes and slimes (half each) into empty spots in the level
+def add_stress(game, level, count, seed):
+    rng = random.Random(seed)
+    LAYOUT = LEVELS[level-1]
+    empty = [
+        (x_idx*BRICK_W, y_idx*BRICK_H)
+        for y_idx, row in enumerate(LAYOUT)
+        for x_idx, char in enumerate(row)
+        if char == " "
+    ]
+    kinds = [components.Box, components.Enemy]
+    game.add(*(kinds[i%2](list(rng.choice(empty)), game.screen) for i in range(count)))
+
+def bench_level(game, level, inputs, stress=0, seed=0):
+    global collide_time
+    # one physics step per frame, no matter how fast we're actually going
+    dt = PHYSICS_STEP
+    game.reset(level)
+    if stress:
+        add_stress(game, level, stress, seed)
+    frame_times = []
+    update_total = 0
+    collide_total = 0
+    render_total = 0
+    # how many bytes each frame allocates on top of what's already there, if tracemalloc is running
+    alloc_total = 0
+    tracing = tracemalloc.is_tracing()
+    # and how often python's garbage collector had to run because of it
+    gc_before = gc.get_stats()[0]["collections"]
+    for keys in inputs:
+        collide_time = 0
+        if tracing:
+            tracemalloc.reset_peak()
+            alloc_start = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        was_reset = game.update(dt, keys)
+        updated = time.perf_counter()
+        # stay on this level even if the player makes it to the goal
+        if game.player.level != level:
+            game.reset(level)
+            was_reset = True
+        if was_reset and stress:
+            add_stress(game, level, stress, seed)
+        if not was_reset:
+            game.render()
+        end = time.perf_counter()
+        profiler.next_frame()
+        if tracing:
+            alloc_total += tracemalloc.get_traced_memory()[1]-alloc_start
+        frame_times.append(end-start)
+        update_total += updated-start-collide_time
+        collide_total += collide_time
+        render_total += end-updated
+    frames = len(frame_times)
+    total = sum(frame_times)
+    return {
+        "level": level,
+        "frames": frames,
+        "fps": frames/total,
+        "p50_ms": percentile(frame_times, 0.5)*1000,
+        "p99_ms": percentile(frame_times, 0.99)*1000,
+        "update_ms": update_total/frames*1000,
+        "collide_ms": collide_total/frames*1000,
+        "render_ms": render_total/frames*1000,
+        "gc_per_1000": (gc.get_stats()[0]["collections"]-gc_before)/frames*1000,
+        "alloc_kb": alloc_total/frames/1024 if tracing else None,
+    }
+
+def print_results(results):
+    print(f"{'level':>5} {'frames':>7} {'fps':>9} {'p50 ms':>8} {'p99 ms':>8} {'update':>8} {'collide':>8} {'render':>8} {'gc/1000':>8} {'alloc kb':>9}")
+    for r in results:
+        alloc = "-" if r["alloc_kb"] is None else f"{r['alloc_kb']:.2f}"
+        print(f"{r['level']:>5} {r['frames']:>7} {r['fps']:>9.0f} {r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f} {r['update_ms']:>8.3f} {r['collide_ms']:>8.3f} {r['render_ms']:>8.3f} {r['gc_per_1000']:>8.1f} {alloc:>9}")
+
+# how long each module takes to import, from python -X importtime in a fresh interpreter
+# returns (cumulative microseconds, self microseconds, module) for each one
+def import_times():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import game"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # skip the header
+        if self_us.strip().isdigit():
+            times.append((int(cumulative_us), int(self_us), name.strip()))
+    return times
+
+# start the game like main.py does and draw one frame, used by startup_report
+def first_frame():
+    pg.display.init()
+    pg.font.init()
+    screen = pg.display.set_mode((WIDTH, HEIGHT))
+    game = Game(screen, pg.time.Clock())
+    game.render()
+    pg.quit()
+
+# how long it takes to get the first frame on screen, and which imports are slowest
+def startup_report(runs=5):
+    first_frames = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--first-frame"], check=True)
+        first_frames.append(time.perf_counter()-start)
+    print(f"first frame after {min(first_frames)*1000:.1f} ms best, {percentile(first_frames, 0.5)*1000:.1f} ms median (including starting python)")
+    times = import_times()
+    print(f"{'cumulative ms':>13} {'self ms':>8}  module")
+    for cumulative_us, self_us, name in sorted(times, reverse=True)[:15]:
+        print(f"{cumulative_us/1000:>13.1f} {self_us/1000:>8.1f}  {name}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run every level headless with scripted input and time the frames")
+    parser.add_argument("--frames", type=int, default=600, help="frames to run per level")
+    parser.add_argument("--levels", type=int, nargs="*", default=list(range(1, len(LEVELS)+1)))
+    parser.add_argument("--seed", type=int, default=0, help="seed for the random input")
+    parser.add_argument("--script", help="input script to use instead of random input")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--stress", type=int, default=0, help="add this many boxes and slimes to every level")
+    parser.add_argument("--numpy", action="store_true", help="use the numpy physics in physics.py")
+    parser.add_argument("--tracemalloc", action="store_true", help="measure how much memory each frame allocates (makes everything much slower)")
+    parser.add_argument("--startup", action="store_true", help="time how long the game takes to start instead, like python -X importtime")
+    parser.add_argument("--wide", type=int, nargs="*", default=[], help="also run levels this many screens wide")
+    parser.add_argument("--trace", help="turn the profiler on and save the last frames as a Chrome trace here (makes everything slower)")
+    parser.add_argument("--first-frame", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.first_frame:
+        first_frame()
+        return
+    if args.startup:
+        startup_report()
+        return
+    levels = args.levels+[add_wide_level(screens) for screens in args.wide]
+
+    pg.display.init()
+    pg.font.init()
+    screen = pg.display.set_mode((WIDTH, HEIGHT))
+    game = Game(screen, pg.time.Clock(), numpy_physics=args.numpy)
+    # don't start timing until the text can be drawn
+    game.fonts.wait()
+    if args.tracemalloc:
+        tracemalloc.start()
+    if args.trace:
+        profiler.enable(PROFILED)
+    results = []
+    for level in levels:
+        if args.script:
+            inputs = script_input(args.script, args.frames)
+        else:
+            inputs = random_input(args.frames, args.seed+level)
+        results.append(bench_level(game, level, inputs, args.stress, args.seed+level))
+    if args.tracemalloc:
+        tracemalloc.stop()
+    if args.trace:
+        profiler.disable()
+        profiler.save_trace(args.trace)
+    pg.quit()
+
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=4)
+
+if __name__ == "__main__":
+    main()
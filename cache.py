@@ -0,0 +1,32 @@
+from collections import OrderedDict
+
+# A dictionary that only keeps the maxsize most recently used entries
+# It counts hits, misses and evictions so we can tell whether it's big enough (they're shown in DEBUG mode)
+class LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # return the value for key, calling make() to create it if it isn't cached
+    def get(self, key, make):
+        value = self.entries.get(key)
+        if value is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return value
+        self.misses += 1
+        value = make()
+        self.entries[key] = value
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        return f"{len(self.entries)}/{self.maxsize} {self.hits} hit {self.misses} miss {self.evictions} evicted"
@@ -1,13 +1,180 @@
 import pygame as pg
 import math
+import struct
+from operator import itemgetter
 from settings import *
+from cache import LRUCache
+from assets import load_sprites, sprite_frames
 
 def add_vectors(v1, v2):
     return [v1[0]+v2[0], v1[1]+v2[1]]
 def mul_vectors(v1, m):
     return [v1[0]*m, v1[1]*m]
 
+# flipped and stretched versions of sprites, keyed by (sprite, flip, stretch)
+# since sprites are shared, eg. every slime falling at the same speed gets the same one
+transform_cache = LRUCache(TRANSFORM_CACHE_SIZE)
+def transform_sprite(sprite, flip, stretch):
+    def make():
+        new_sprite = sprite
+        if flip:
+            new_sprite = pg.transform.flip(new_sprite, True, False)
+        if stretch != 0:
+            new_sprite = pg.transform.scale_by(new_sprite, (1, 1+stretch*SQUASH_STEP))
+        return new_sprite
+    return transform_cache.get((sprite, flip, stretch), make)
+
+# which side of the other entity we hit, eg. LEFT means our right side hit their left side
+# BOTH is a corner collision, for both the direction and the axis
+LEFT, RIGHT, TOP, BOTTOM, BOTH = range(5)
+# which axis a collision is on, numbered after the directions so they can't be mixed up
+X, Y = range(5, 7)
+# the direction the other entity hit us from when we hit them from direction
+OPPOSITE = (RIGHT, LEFT, BOTTOM, TOP, BOTH)
+
+# Collision layers
+# every class is on one layer, and its mask says which layers it can collide with (see COLLISION_HANDLERS)
+# SOLID is everything that other things bounce off, the rest are things you only pass through
+SOLID = 1
+ENEMY = 2
+GOAL = 4
+BOUNCER = 8
+
+# What collision handlers get told about a collision
+# there are only ever two of these (see Entity.handle_collisions) which are filled in again for every collision
+# so don't hang on to one after the handler returns
+# intersection: pg.Rect representing the overlap of the two entity's Rects (empty if we'd have gone straight through it)
+# should_bounce: Boolean for whether one entity should bounce off the other, or just stop colliding
+# direction: LEFT | RIGHT | TOP | BOTTOM | BOTH; direction of collision (see above)
+# axis: X | Y | BOTH; which axis the collision is on; BOTH means a corner collision
+class Collision:
+    __slots__ = ("intersection", "should_bounce", "axis", "direction")
+our_collision = Collision()
+their_collision = Collision()
+
+# sort key for hits from sweep
+hit_time = itemgetter(0)
+
+# How the world maps onto the screen, every Game has its own and passes it to whatever it draws
+# levels are always simulated at their original size (WIDTH x HEIGHT) and only drawn bigger or smaller
+# so resizing the window just changes the scale here, see Game.resize
+# camera_x and camera_y are where the top left of the screen is, in (scaled) screen pixels, see Game.move_camera
+# time is the player's time, for animating things that never update like lava (Game.update keeps it up to date)
+class View:
+    def __init__(self):
+        self.scale_x = 1
+        self.scale_y = 1
+        self.camera_x = 0
+        self.camera_y = 0
+        self.time = 0
+
+    def unscaled(self):
+        return self.scale_x == 1 and self.scale_y == 1
+
+    # whether world and screen coordinates are the same, which lets rendering skip the conversion
+    def identity(self):
+        return self.unscaled() and self.camera_x == 0 and self.camera_y == 0
+
+    # the size of something size big in the world on screen
+    # rounded up so neighbouring tiles never leave a gap between them
+    def scale_size(self, size):
+        return (math.ceil(size[0]*self.scale_x), math.ceil(size[1]*self.scale_y))
+
+    # where a point would be on screen if the camera was at 0, 0
+    # things that stay put on screen like the HUD use this directly
+    def scale_point(self, x, y):
+        return (round(x*self.scale_x), round(y*self.scale_y))
+
+    def point_to_screen(self, x, y):
+        return (round(x*self.scale_x)-self.camera_x, round(y*self.scale_y)-self.camera_y)
+
+    # moving things keep the same size wherever they are
+    def to_screen(self, x, y, size):
+        return pg.Rect(self.point_to_screen(x, y), self.scale_size(size))
+
+    # things that never move go by where their edges end up instead, so tiles that touch still touch exactly
+    def edges_to_screen(self, x, y, size):
+        left, top = self.point_to_screen(x, y)
+        right, bottom = self.point_to_screen(x+size[0], y+size[1])
+        return pg.Rect(left, top, right-left, bottom-top)
+
+# Swept collision test: when does a rect moving from start to end first overlap rect?
+# returns (time, axis, direction) or None if it never does
+# time goes from 0 at start to 1 at end, so sorting by it puts collisions in the order they happen
+# axis and direction are the same as in Collision
+# if we were already overlapping at the start the time is negative, and we pick the axis we overlap least on
+def sweep(start, end, rect):
+    dx = end.x-start.x
+    dy = end.y-start.y
+    if dx > 0:
+        x_entry = (rect.left-start.right)/dx
+        x_exit = (rect.right-start.left)/dx
+    elif dx < 0:
+        x_entry = (rect.right-start.left)/dx
+        x_exit = (rect.left-start.right)/dx
+    elif start.right > rect.left and start.left < rect.right:
+        x_entry = -math.inf
+        x_exit = math.inf
+    else:
+        return None
+    if dy > 0:
+        y_entry = (rect.top-start.bottom)/dy
+        y_exit = (rect.bottom-start.top)/dy
+    elif dy < 0:
+        y_entry = (rect.bottom-start.top)/dy
+        y_exit = (rect.top-start.bottom)/dy
+    elif start.bottom > rect.top and start.top < rect.bottom:
+        y_entry = -math.inf
+        y_exit = math.inf
+    else:
+        return None
+    entry = max(x_entry, y_entry)
+    exit = min(x_exit, y_exit)
+    # just touching at the end doesn't count, and neither does something we'd already left behind
+    if entry >= exit or entry >= 1 or exit <= 0:
+        return None
+    if entry < 0:
+        # already overlapping, so go by which way we'd have to move the least to get out
+        overlap = start.clip(rect)
+        if overlap.height > overlap.width:
+            return (entry, X, LEFT if start.x < rect.x else RIGHT)
+        elif overlap.width > overlap.height:
+            return (entry, Y, TOP if start.y < rect.y else BOTTOM)
+        return (entry, BOTH, BOTH)
+    # otherwise it's whichever axis we started overlapping on last
+    if x_entry > y_entry:
+        return (entry, X, LEFT if dx > 0 else RIGHT)
+    elif y_entry > x_entry:
+        return (entry, Y, TOP if dy > 0 else BOTTOM)
+    return (entry, BOTH, BOTH)
+
+# how save_state packs an entity: its rect, vel, acc, on_ground, remove, asleep, rest_frames, prev_pos,
+# active_sprite and last_rotation
+# the player has PLAYER_STATE straight after that: next_level, level, last_on_ground, jumping, target_vel and time
+ENTITY_STATE = struct.Struct("<4i4d3?i2iHd")
+PLAYER_STATE = struct.Struct("<?Hi?dd")
+
 class Entity:
+    # every entity has exactly these attributes (plus whatever its class adds in its own __slots__)
+    # so there's no per-entity __dict__, which makes them smaller and quicker to get attributes from
+    __slots__ = (
+        "remove", "rect", "mass", "vel", "acc", "on_ground", "collided", "prev_pos",
+        "flip", "animation", "active_sprite", "last_rotation", "display", "sprites", "tile_size",
+        "asleep", "rest_frames", "ahead", "body",
+    )
+    # animated entities change how they look even when they don't move, so they're redrawn every frame
+    animated = False
+    # static entities are level geometry that never moves
+    # they live in their own layer and never get updated, moving entities collide with them instead
+    static = False
+    # whether gravity pulls us down
+    falls = True
+    # whether we go to sleep after sitting still for a while, see settle
+    can_sleep = True
+    # the collision layer we're on, and the ones we collide with (filled in from COLLISION_HANDLERS)
+    layer = SOLID
+    mask = SOLID
+    # sprites is the name of the entity's frames in SPRITES
     def __init__(self, init_pos, init_size, sprites, display, flip=True):
         self.remove = False
         size = (init_size[0]*WIDTH/INITIAL_WIDTH, init_size[1]*HEIGHT/INITIAL_HEIGHT)
@@ -18,92 +185,128 @@ class Entity:
         self.vel = [0.0,0.0]
         self.acc = [0.0,0.0]
         self.on_ground = False
-        self.collided = []
+        # everything we've bounced off (or that's bounced off us) since our last handle_collisions
+        # it's a set since it's only ever used to check whether a pair has already been dealt with
+        self.collided = set()
+        # where we were before the last physics step, so rendering can go smoothly between steps
+        self.prev_pos = self.rect.topleft
+        # sleeping entities are skipped by Game.update until something wakes them up
+        self.asleep = False
+        # how many steps in a row we've been sitting still for
+        self.rest_frames = 0
+        # the physics.Bodies that's worked out our velocity this step ahead of our turn, if one has, and our row in it
+        self.ahead = None
+        self.body = 0
 
         self.flip = flip
         self.set_animation(sprites)
         self.display = display
     
     def set_animation(self, sprites):
-        self.animation = [pg.transform.scale(sprite, self.rect.size) for sprite in sprites]
+        self.sprites = sprites
+        # the size of one copy of the sprite in the world, merged tiles are covered in several of them (see resize_sprite)
+        self.tile_size = self.rect.size
+        # these are at the size we are in the world, render scales them for the screen the first time we're drawn
+        self.animation = sprite_frames(sprites, self.tile_size)
         self.active_sprite = 0
         self.last_rotation = 0
 
-    # each class should override handle_collision with its particular collision logic
-    def handle_collision(self, item, collision_data):
-        pass
+    # every item in candidates we'd run into moving from start to where we are now
+    # as (time, axis, direction, item), see sweep
+    def find_hits(self, start, candidates):
+        hits = []
+        # nothing outside the area we swept over can be hit, and checking that is much quicker than sweep
+        swept = start.union(self.rect)
+        for item in candidates:
+            if not swept.colliderect(item.rect):
+                continue
+            hit = sweep(start, self.rect, item.rect)
+            if hit is not None:
+                hits.append((*hit, item))
+        return hits
 
-    def handle_collisions(self, world):
-        self.collided = []
+    # start is where we were before moving this frame, so we can catch things we'd have gone straight through
+    # world is a SpatialHash, so we only look at items in the cells around the path we took
+    # we search one of our own widths/heights further out in every direction since bouncing off something
+    # can push us that far over while we're still resolving collisions
+    def handle_collisions(self, world, start=None):
+        if start is None:
+            start = self.rect
+        self.collided.clear()
         new_on_ground = False
-        for item in world:
-            # Never collide twice with the same item in the same frame
-            if item is self or item in self.collided or self in item.collided:
-                continue
+        area = start.union(self.rect).inflate(self.rect.width*2, self.rect.height*2)
+        # Never collide twice with the same item in the same frame
+        # and don't bother with anything we can't interact with at all
+        mask = self.mask
+        nearby = world.near(area)
+        candidates = [item for item in nearby if item.layer & mask and item is not self and self not in item.collided]
+        hits = self.find_hits(start, candidates)
+        # deal with whatever we hit first, then see what we still hit from where that left us
+        while hits:
+            hit = min(hits, key=hit_time)
+            hits.remove(hit)
+            time, axis, direction, item = hit
+            # anything we do to it has to happen before it's started its own update, like it does without physics.py
+            if item.ahead is not None:
+                item.ahead.take_back(item)
             should_bounce = type(item).bounces
-            intersection = self.rect.clip(item.rect)
-            if intersection.width == 0 or intersection.height == 0:
-                continue
-            
-            # collision_data format:
-            # intersection: pg.Rect representing the overlap of the two entity's Rects
-            # should_bounce: Boolean for whether one entity should bounce off the other, or just stop colliding
-            # direction: "left" | "right" | "top" | "bottom" | "both"; direction of collision (eg. "left" means the left side of the other entity is hitting the right side of this entity)
-            # axis: "x" | "y" | "both"; which axis the collision is on; "both" means a corner collision
-            collision_data = {
-                "intersection": intersection,
-                "should_bounce": should_bounce,
-            }
-            if intersection.height-intersection.width > 2:
-                collision_data["axis"] = "x"
-                if should_bounce:
+            before_x = self.rect.x
+            before_y = self.rect.y
+
+            collision_data = our_collision
+            collision_data.intersection = self.rect.clip(item.rect)
+            collision_data.should_bounce = should_bounce
+            collision_data.axis = axis
+            collision_data.direction = direction
+            if should_bounce:
+                if direction == LEFT:
                     item.acc[0] += self.vel[0]*self.mass
                     self.vel[0] *= -1
-                if self.rect.x < item.rect.x:
-                    if should_bounce:
-                        self.rect.x = item.rect.x-self.rect.width
-                    collision_data["direction"] = "left"
-                else:
-                    if should_bounce:
-                        self.rect.x = item.rect.right
-                    collision_data["direction"] = "right"
-            elif intersection.width-intersection.height > 2:
-                collision_data["axis"] = "y"
-                if self.rect.y < item.rect.y:
-                    collision_data["direction"] = "top"
-                    if should_bounce:
-                        self.rect.y = item.rect.y-self.rect.height
-                        self.vel[1] = 0
-                        new_on_ground = True
-                else:
-                    collision_data["direction"] = "bottom"
-                    if should_bounce:
-                        self.rect.y = item.rect.bottom
-                        self.vel[1] = 0
-            else:
-                collision_data["axis"] = "both"
-                collision_data["direction"] = "both"
-            self.handle_collision(item, collision_data)
+                    self.rect.x = item.rect.x-self.rect.width
+                elif direction == RIGHT:
+                    item.acc[0] += self.vel[0]*self.mass
+                    self.vel[0] *= -1
+                    self.rect.x = item.rect.right
+                elif direction == TOP:
+                    self.rect.y = item.rect.y-self.rect.height
+                    self.vel[1] = 0
+                    new_on_ground = True
+                elif direction == BOTTOM:
+                    self.rect.y = item.rect.bottom
+                    self.vel[1] = 0
+            handler = collision_handlers.get((type(self), type(item)))
+            if handler is not None:
+                handler(self, item, collision_data)
             if should_bounce:
-                self.collided.append(item)
-                item.collided.append(self)
-                opposite_dirs = {
-                    "left": "right",
-                    "right": "left",
-                    "top": "bottom",
-                    "bottom": "top",
-                    "both": "both"
-                }
+                self.collided.add(item)
+                # static entities never run their own collisions (or clear their list), so there's nothing to mark
+                if not item.static:
+                    item.collided.add(self)
                 # on collision, have the other entity handle a collision with us
                 # that way we know both entities handle the collision exactly once
-                item.handle_collision(self, {
-                    "intersection": collision_data["intersection"],
-                    "axis": collision_data["axis"],
-                    "direction": opposite_dirs[collision_data["direction"]],
-                    "should_bounce": True,
-                })
+                handler = collision_handlers.get((type(item), type(self)))
+                if handler is not None:
+                    their_data = their_collision
+                    their_data.intersection = collision_data.intersection
+                    their_data.axis = collision_data.axis
+                    their_data.direction = OPPOSITE[collision_data.direction]
+                    their_data.should_bounce = True
+                    handler(item, self, their_data)
+            if item.asleep:
+                item.wake()
+            if hits and (self.rect.x != before_x or self.rect.y != before_y):
+                hits = self.find_hits(start, [hit[3] for hit in hits])
         self.on_ground = new_on_ground
+        # anything asleep right next to where we moved has to wake up too, eg. a box sitting on a sliding brick
+        # that's whatever's there, not just what we can collide with (a goal sitting on a box still has to fall)
+        if self.rect.x != start.x or self.rect.y != start.y:
+            touching = start.union(self.rect).inflate(2, 2)
+            for item in nearby:
+                if item.asleep and touching.colliderect(item.rect):
+                    item.wake()
     def add_gravity(self):
+        if not self.falls:
+            return
         # the player has a different gravity when jumping than when falling
         # it helps make the jump feel better
         # this should probably be in the Player class instead but whatever
@@ -112,35 +315,106 @@ class Entity:
         else:
             self.acc[1] += GRAVITY*self.mass
 
-    def update(self, world):
+    # an update is split into three parts so physics.py can do most of the middle one for every entity at once:
+    # before_physics adds whatever forces the entity wants to acc,
+    # integrate works out its new velocity and moves it (returning where it started),
+    # and finish_update sorts out collisions and calls after_physics
+    # vel and acc are always changed in place since with physics.py they're rows of its arrays
+    def before_physics(self):
+        pass
+    def after_physics(self):
+        pass
+
+    def integrate(self):
         self.add_gravity()
-        self.vel = add_vectors(self.vel, mul_vectors(self.acc, 1/self.mass))
+        inverse_mass = 1/self.mass
+        self.vel[0] += self.acc[0]*inverse_mass
+        self.vel[1] += self.acc[1]*inverse_mass
         # No-one's going to accelerate past the TERMINAL_VEL in the x direction right
         if self.vel[1] > TERMINAL_VEL:
             self.vel[1] = TERMINAL_VEL
+        return self.move()
+
+    # returns where we started
+    def move(self):
+        start = self.rect.copy()
         self.rect.x += self.vel[0]
         self.rect.y += self.vel[1]
-        self.handle_collisions(world)
-        self.acc = [0,0]
+        return start
+
+    def finish_update(self, world, start):
+        self.handle_collisions(world, start)
+        self.acc[0] = 0
+        self.acc[1] = 0
+        self.after_physics()
+        if SLEEPING and self.can_sleep:
+            self.settle(start)
+
+    # a box resting on the floor would otherwise fall into it and get pushed back out every step forever
+    # so once we've stayed in the same place and barely moving for SLEEP_FRAMES steps we go to sleep
+    def settle(self, start):
+        if self.rect.x == start.x and self.rect.y == start.y and abs(self.vel[0]) < SLEEP_VEL and abs(self.vel[1]) < SLEEP_VEL:
+            self.rest_frames += 1
+            if self.rest_frames >= SLEEP_FRAMES:
+                self.asleep = True
+                # we're at rest, so stay exactly where we are
+                self.vel[0] = 0
+                self.vel[1] = 0
+                # nothing clears this while we're asleep, and anything in it couldn't collide with us
+                self.collided.clear()
+        else:
+            self.rest_frames = 0
+
+    # anything that hits us or moves right next to us wakes us up (see handle_collisions)
+    # and anything else that needs us moving again, eg. a scripted event, can call this too
+    def wake(self):
+        self.asleep = False
+        self.rest_frames = 0
+
+    # everything about us that changes as the game goes on, packed into ENTITY_STATE (see Game.snapshot)
+    # collided holds other entities so Game.snapshot keeps that itself
+    def save_state(self):
+        rect = self.rect
+        return ENTITY_STATE.pack(
+            rect.x, rect.y, rect.width, rect.height, self.vel[0], self.vel[1], self.acc[0], self.acc[1],
+            self.on_ground, self.remove, self.asleep, self.rest_frames, *self.prev_pos, self.active_sprite, self.last_rotation,
+        )
+
+    # put back what save_state packed, starting at offset in data
+    # returns where the next entity's state starts
+    # rect, vel and acc are changed in place since the grid and physics.py hold on to them
+    def load_state(self, data, offset):
+        (
+            x, y, width, height, vel_x, vel_y, acc_x, acc_y,
+            self.on_ground, self.remove, self.asleep, self.rest_frames, prev_x, prev_y, self.active_sprite, self.last_rotation,
+        ) = ENTITY_STATE.unpack_from(data, offset)
+        self.rect.update(x, y, width, height)
+        self.vel[0] = vel_x
+        self.vel[1] = vel_y
+        self.acc[0] = acc_x
+        self.acc[1] = acc_y
+        self.prev_pos = (prev_x, prev_y)
+        self.collided.clear()
+        return offset+ENTITY_STATE.size
+
+    def update(self, world):
+        self.before_physics()
+        self.finish_update(world, self.integrate())
     
     # Since we merge adjacent bricks, we have to do fancy things to the sprite to make it look right
-    def resize_sprite(self):
+    # merged tiles can be blocks several bricks wide and tall, so the sprite is tiled in both directions
+    # size is how big we are on screen, which changes with the window size too
+    def resize_sprite(self, view, size):
+        width, height = size
         new_animation = []
-        for sprite in self.animation:
+        for sprite in sprite_frames(self.sprites, view.scale_size(self.tile_size)):
             sprite_rect = sprite.get_rect()
             new_sprite = sprite
-            if self.rect.width > sprite_rect.width:
-                new_sprite = pg.Surface(self.rect.size, sprite.get_flags())
-                x = 0
-                while x <= self.rect.width:
-                    new_sprite.blit(sprite, (x, 0))
-                    x += sprite_rect.width
-            elif self.rect.height > sprite_rect.height:
-                new_sprite = pg.Surface(self.rect.size, sprite.get_flags())
-                y = 0
-                while y <= self.rect.height:
-                    new_sprite.blit(sprite, (0,y))
-                    y += sprite_rect.height
+            if width > sprite_rect.width or height > sprite_rect.height:
+                new_sprite = pg.Surface(size, sprite.get_flags(), sprite)
+                for x in range(0, width, sprite_rect.width):
+                    for y in range(0, height, sprite_rect.height):
+                        new_sprite.blit(sprite, (x, y))
             new_animation.append(new_sprite)
         self.animation = new_animation
 
@@ -158,59 +432,107 @@ class Entity:
             if self.active_sprite >= len(self.animation):
                 self.active_sprite = 1
 
-    def render(self):
+    # where to draw ourselves on screen, alpha of the way from where we were before the last physics step to where we are now
+    def render_rect(self, view, alpha):
+        if alpha >= 1:
+            if view.identity():
+                return self.rect
+            x, y = self.rect.topleft
+            if self.static:
+                return view.edges_to_screen(x, y, self.rect.size)
+        else:
+            x = self.prev_pos[0]+(self.rect.x-self.prev_pos[0])*alpha
+            y = self.prev_pos[1]+(self.rect.y-self.prev_pos[1])*alpha
+        return view.to_screen(x, y, self.rect.size)
+
+    # view is the drawing game's View
+    # display defaults to our own display, but the background cache in game.py draws static tiles onto its own surface
+    # alpha is how far we are between the last physics step and the next one (see Game.advance)
+    # returns the area we drew over so only that part of the screen has to be updated
+    def render(self, view, display=None, alpha=1):
+        if display is None:
+            display = self.display
+        rect = self.render_rect(view, alpha)
         sprite = self.animation[self.active_sprite]
-        if sprite.get_width() != self.rect.width or sprite.get_height() != self.rect.height:
-            self.resize_sprite()
+        if sprite.get_width() != rect.width or sprite.get_height() != rect.height:
+            self.resize_sprite(view, rect.size)
         sprite = self.animation[self.active_sprite]
         # assume sprites are oriented right by default, so flip them if moving left
-        if self.vel[0] < 0 and self.flip:
-            sprite = pg.transform.flip(sprite, True, False)
+        flip = self.vel[0] < 0 and self.flip
         # stretch vertically to make it bouncy
-        scale = 1
+        # stretch is how many SQUASH_STEPs to add to the height, so the scale is 1+stretch*SQUASH_STEP
+        stretch = 0
         if abs(self.vel[1]) > 5:
             scale = 1+math.log((abs(self.vel[1])-5))/4
-            sprite = pg.transform.scale_by(sprite, (1, scale))
+            stretch = round((scale-1)/SQUASH_STEP)
+        if flip or stretch != 0:
+            sprite = transform_sprite(sprite, flip, stretch)
         # offset so if the sprite is stretched the bottom is still in the right place
         # otherwise you clip through the ground sometimes
-        self.display.blit(sprite, (self.rect.left, self.rect.top-(sprite.get_height()-self.rect.height)))
+        drawn = display.blit(sprite, (rect.left, rect.top-(sprite.get_height()-rect.height)))
         if DEBUG:
-            color = RED
-            if self.on_ground:
-                color = GREEN
-            elif type(self) is Player and self.jumping:
-                color = BLUE
-            pg.draw.rect(self.display, color, self.rect, 1)
+            self.render_debug(display, rect)
+        # squashed sprites can be shorter than our rect, and the debug outline is drawn over the whole rect
+        return drawn.union(rect)
+
+    def render_debug(self, display, rect):
+        color = RED
+        if self.on_ground:
+            color = GREEN
+        elif type(self) is Player and self.jumping:
+            color = BLUE
+        pg.draw.rect(display, color, rect, 1)
 
 class Player(Entity):
+    __slots__ = ("speed", "next_level", "level", "ground", "last_on_ground", "jumping", "target_vel", "time", "dt", "keys")
     bounces = True
+    # the keys can change at any time
+    can_sleep = False
     def __init__(self, pos, display):
-        super().__init__(pos, [PLAYER_W, PLAYER_H], SPRITES["player"], display)
+        super().__init__(pos, [PLAYER_W, PLAYER_H], "player", display)
         self.speed = PLAYER_SPEED
         self.next_level = False
         self.level = 1
         self.ground = None
         self.last_on_ground = 0
         self.jumping = False
+        # what friction pulls our x velocity towards this step (see before_physics)
+        self.target_vel = 0
         self.time = 0
         self.dt = 0
+        # the keys being held down, indexed like pg.key.get_pressed()
+        # None means read the real keyboard, otherwise it's scripted input (see bench.py)
+        self.keys = None
 
-    
-    def handle_collision(self, item, collision_data):
-        if type(item) is Enemy:
-            if not self.on_ground:
-                item.remove = True
-                self.vel[1] = -JUMP_STRENGTH
-            else:
-                self.remove = True
-        elif collision_data["direction"] == "top":
+    # ground is another entity so Game.snapshot keeps that itself too
+    def save_state(self):
+        return super().save_state()+PLAYER_STATE.pack(
+            self.next_level, self.level, self.last_on_ground, self.jumping, self.target_vel, self.time,
+        )
+
+    def load_state(self, data, offset):
+        offset = super().load_state(data, offset)
+        self.next_level, self.level, self.last_on_ground, self.jumping, self.target_vel, self.time = PLAYER_STATE.unpack_from(data, offset)
+        return offset+PLAYER_STATE.size
+
+    # jumping on an enemy kills it, walking into one kills us
+    def hit_enemy(self, enemy, collision_data):
+        if not self.on_ground:
+            enemy.remove = True
+            self.vel[1] = -JUMP_STRENGTH
+        else:
+            self.remove = True
+
+    def land(self, item, collision_data):
+        if collision_data.direction == TOP:
             self.ground = item
     
-    def update_time(self, clock):
-        self.dt = clock.get_time()
+    # dt is the number of milliseconds since the last frame
+    def update_time(self, dt):
+        self.dt = dt
         self.time += self.dt 
 
-    def update(self, world):
+    def before_physics(self):
         self.handle_keys()
 
         friction = MOVING_FRICT
@@ -221,9 +543,10 @@ class Player(Entity):
             # on moving blocks, friction pulls the player to the block's velocity rather than to 0
             target_vel = self.ground.vel[0]
         self.acc[0] += (target_vel-self.vel[0])*friction*self.mass
+        self.target_vel = target_vel
 
-        super().update(world)
-
+    def after_physics(self):
+        target_vel = self.target_vel
         if self.on_ground:
             self.last_on_ground = 0
             self.jumping = False
@@ -234,11 +557,12 @@ class Player(Entity):
             else:
                 self.reset_animation()
         else:
-            self.groud = None
             self.last_on_ground += 1
 
     def handle_keys(self):
-        keys = pg.key.get_pressed()
+        keys = self.keys
+        if keys is None:
+            keys = pg.key.get_pressed()
         if keys[pg.K_LEFT]:
             self.acc[0] -= self.speed*self.mass 
         if keys[pg.K_RIGHT]:
@@ -256,129 +580,208 @@ class Player(Entity):
         
 
 class Box(Entity):
+    __slots__ = ()
     bounces = True
     def __init__(self, pos, display):
-        super().__init__(pos, [BOX_W, BOX_W], SPRITES["box"], display, False)
-    def update(self, world):
+        super().__init__(pos, [BOX_W, BOX_W], "box", display, False)
+    def before_physics(self):
         self.acc[0] -= self.vel[0]*GROUND_FRICT*self.mass
-        super().update(world)
 
     
 class Brick(Entity):
+    __slots__ = ("init_pos",)
     bounces = True
+    static = True
     def __init__(self, pos, display):
-        super().__init__(pos, [BRICK_W, BRICK_H], SPRITES["brick"], display)
+        super().__init__(pos, [BRICK_W, BRICK_H], "brick", display)
         self.init_pos = list(pos)
-    # all of this just makes sure Bricks never move
-    def handle_collision(self, item, collision_data):
-        self.vel = [0,0]
-        self.acc = [0,0]
-        self.rect.topleft = list(self.init_pos)
+    # Bricks are static so main.py never calls this, everything that hits them handles the collision for both sides
     def update(self, world):
-        self.rect.topleft = list(self.init_pos)
-        self.vel = [0,0]
-        self.acc = [0,0]
-        self.handle_collisions(world)
+        pass
 
 class GrassBrick(Brick):
+    __slots__ = ()
     bounces = True
     def __init__(self, *args):
         super().__init__(*args)
-        self.set_animation(SPRITES["grass"])
+        self.set_animation("grass")
 
 class SlidingBrick(Entity):
+    __slots__ = ("init_y", "switched")
     bounces = True
+    falls = False
     def __init__(self, pos, display):
-        super().__init__(pos, [BRICK_W, BRICK_H], SPRITES["platform"], display)
+        super().__init__(pos, [BRICK_W, BRICK_H], "platform", display)
         self.init_y = pos[1]
         self.vel = [-1, 0]
-    def handle_collision(self, item, collision_data):
-        # We could allow the default behavior to bounce us around but then the player can
-        # speed it up or slow it down with strategic bounces off the side
-        if type(item) is SlidingBrickBouncer:
-            self.vel[0] *= -1
-            self.switched = True
-            if self.rect.x < item.rect.x:
-                self.rect.x = item.rect.x-self.rect.width
-            else:
-                self.rect.x = item.rect.right
-        elif collision_data["axis"] == "x" and collision_data["should_bounce"]:
+    # We could allow the default behavior to bounce us around but then the player can
+    # speed it up or slow it down with strategic bounces off the side
+    def turn_around(self, bouncer, collision_data):
+        self.vel[0] *= -1
+        self.switched = True
+        if self.rect.x < bouncer.rect.x:
+            self.rect.x = bouncer.rect.x-self.rect.width
+        else:
+            self.rect.x = bouncer.rect.right
+    def bounce(self, item, collision_data):
+        if collision_data.axis == X and collision_data.should_bounce:
             self.vel[0] *= -1
-    def add_gravity(self):
-        pass
-    def update(self, world):
+    def before_physics(self):
         self.vel[1] = 0
         if self.vel[0] < 0:
             self.vel[0] = -1
         else:
             self.vel[0] = 1
-        self.acc = [0, 0]
-        super().update(world)
+        self.acc[0] = 0
+        self.acc[1] = 0
+    def after_physics(self):
         self.rect.top = self.init_y
 
 class SlidingBrickBouncer(Brick):
+    __slots__ = ()
     bounces = False
-    def render(self):
-        pass
+    layer = BOUNCER
+    def render(self, view, display=None, alpha=1):
+        return None
 
 
 class Lava(Brick):
+    __slots__ = ()
     bounces = True
+    animated = True
+    # the lava sprite tiled out to the size of a lava entity plus one extra sprite width, keyed by (size, sprite size)
+    # scrolling is then just drawing a different window of it, and all the lava of the same size shares one
+    # sizes are on screen sizes, so like sprite atlases these are cleared by Game.resize
+    strips = {}
     def __init__(self, pos, display):
         super().__init__(pos, display)
-        self.animation = SPRITES["lava"]
-        self.animation.append(self.animation[0].copy())
-        self.original_sprite = self.animation[0].copy()
-        self.time = 0
-    def handle_collision(self, item, collision_data):
-        if type(item) is Player:
-            item.remove = True
-        return super().handle_collision(item, collision_data)
-    def update(self, world):
-        self.time = world[0].time
-        super().update(world)
-    def render(self):
+        self.animation = load_sprites("lava")
+    def burn(self, player, collision_data):
+        player.remove = True
+    # the lava sprite at the size it's drawn at on screen
+    def get_sprite(self, view):
+        sprite = self.animation[0]
+        if view.unscaled():
+            return sprite
+        return sprite_frames("lava", view.scale_size(sprite.get_size()))[0]
+    def get_strip(self, size, sprite):
+        key = (size, sprite.get_size())
+        if key not in Lava.strips:
+            # we tile the original sprite instead of stretching it
+            # otherwise the sprite isn't perfectly looping so it doesn't work
+            sprite_w, sprite_h = sprite.get_size()
+            strip = pg.Surface((size[0]+sprite_w, size[1]), sprite.get_flags())
+            for x in range(0, strip.get_width(), sprite_w):
+                for y in range(0, size[1], sprite_h):
+                    strip.blit(sprite, (x, y))
+            Lava.strips[key] = strip
+        return Lava.strips[key]
+    # lava never moves so there's nothing to interpolate
+    # and it never updates either, so it goes by view.time to animate
+    def render(self, view, display=None, alpha=1):
+        if display is None:
+            display = self.display
+        rect = self.render_rect(view, 1)
         # essentially we're shifting the sprite over a bit each frame, and wrapping the part that falls off the edge around to the other side
-        # we use the original sprite and then let the Entity render method handle stretching it out to the correct size
-        # otherwise the sprite isn't perfectly looping so it doesn't work
-        sprite = self.original_sprite
-        size = sprite.get_rect()
-        shifted_sprite = pg.Surface(size.size, sprite.get_flags())
+        # since the strip repeats every sprite width, shifting right by shift_width is the same as starting that far from the end of the first copy
+        sprite = self.get_sprite(view)
+        strip = self.get_strip(rect.size, sprite)
+        sprite_width = sprite.get_width()
         # FREQ is the number of milliseconds it should take for one full rotation to pass
         # so if the wave peaks somewhere at 0 milliseconds, it will peak there again after FREQ milliseconds
         FREQ = 5000
-        shift_percent = (self.time%FREQ)/FREQ
-        shift_width = math.floor(shift_percent*size.width)
-        shifted_sprite.blit(sprite, (0,0), pg.Rect(size.width-shift_width,0,shift_width,size.height))
-        shifted_sprite.blit(sprite, (shift_width,0), pg.Rect(0,0,size.width-shift_width,size.height))
-        self.animation[1] = shifted_sprite
-        self.active_sprite = 1
-        super().render()
-        self.active_sprite = 0
+        shift_percent = (view.time%FREQ)/FREQ
+        shift_width = math.floor(shift_percent*sprite_width)
+        drawn = display.blit(strip, rect, pg.Rect(sprite_width-shift_width, 0, *rect.size))
+        if DEBUG:
+            self.render_debug(display, rect)
+        return drawn
 
 class Goal(Entity):
+    __slots__ = ()
     bounces = False
+    layer = GOAL
     def __init__(self, pos, display):
-        super().__init__(pos, [GOLD_W,GOLD_H], SPRITES["gold"], display)
-    def handle_collision(self, item, collision_data):
-        if type(item) is Player:
-            item.next_level = True
-            self.remove = True
-        return super().handle_collision(item, collision_data)
+        super().__init__(pos, [GOLD_W,GOLD_H], "gold", display)
+    def reach(self, player, collision_data):
+        player.next_level = True
+        self.remove = True
 
 class Enemy(Entity):
+    __slots__ = ()
     bounces = False
+    layer = ENEMY
     def __init__(self, pos, display):
-        super().__init__(pos, [ENEMY_W, ENEMY_H], SPRITES["enemy"], display)
+        super().__init__(pos, [ENEMY_W, ENEMY_H], "enemy", display)
         self.vel = [-1, 0]
     
-    def handle_collision(self, item, collision_data):
-        if type(item) is not Brick and type(item) is not GrassBrick:
-            return
+    def patrol(self, brick, collision_data):
         # enemies walk back and forth across platforms by detecting when they start colliding with the corner instead of the top
         # or falling off the edge
-        if collision_data["direction"] == "top":
-            if self.rect.x < item.rect.x or self.rect.right > item.rect.right:
+        if collision_data.direction == TOP:
+            if self.rect.x < brick.rect.x or self.rect.right > brick.rect.right:
                 self.vel[0] *= -1
         else:
             self.vel[0] *= -1
+
+# what each character in a level layout (see levels.py) stands for
+LAYOUT_KEY = {
+    "player": "@",
+    "score": "U",
+    "sign": "S",
+    "#": {
+        "type": GrassBrick,
+        "merge": True
+    },
+    "H": {
+        "type": Brick,
+        "merge": True
+    },
+    "*": {
+        "type": Lava,
+        "merge": True
+    },
+    "-": {
+        "type": SlidingBrick,
+        "merge": True
+    },
+    "|": {
+        "type": SlidingBrickBouncer,
+        "merge": False
+    },
+    "^": {
+        "type": Enemy,
+        "merge": False
+    },
+    "=": {
+        "type": Box,
+        "merge": False
+    },
+    "O": {
+        "type": Goal,
+        "merge": False
+    }
+}
+
+# What happens when one kind of entity runs into another, as (our type, their type) -> handler(us, them, collision_data)
+# when we run into something that bounces, they get their handler called too, with the collision from their side
+# types have to match exactly, eg. enemies turn around on Bricks and GrassBricks but not Lava
+SOLID_TYPES = (Player, Box, Brick, GrassBrick, SlidingBrick, Lava)
+ENTITY_TYPES = (*SOLID_TYPES, SlidingBrickBouncer, Goal, Enemy)
+collision_handlers = {
+    (Player, Enemy): Player.hit_enemy,
+    # this includes things we fall straight through like the goal, which is how it's always been
+    **{(Player, kind): Player.land for kind in ENTITY_TYPES if kind is not Enemy},
+    (Lava, Player): Lava.burn,
+    (Goal, Player): Goal.reach,
+    (SlidingBrick, SlidingBrickBouncer): SlidingBrick.turn_around,
+    # we pass straight through enemies and the goal, so they don't turn us around (see SlidingBrick.bounce)
+    **{(SlidingBrick, kind): SlidingBrick.bounce for kind in ENTITY_TYPES if kind is not SlidingBrickBouncer},
+    (Enemy, Brick): Enemy.patrol,
+    (Enemy, GrassBrick): Enemy.patrol,
+}
+# everything collides with whatever bounces, plus anything it has a handler with either way round
+# so pairs that can never do anything (eg. an enemy and a bouncer) are skipped before we even sweep them
+for ours, theirs in collision_handlers:
+    ours.mask |= theirs.layer
+    theirs.mask |= ours.layer
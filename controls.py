@@ -0,0 +1,25 @@
+import pygame as pg
+
+# Input for the player that doesn't come from the keyboard, indexable like pg.key.get_pressed()
+class Keys:
+    def __init__(self, held=()):
+        self.held = frozenset(held)
+    def __getitem__(self, key):
+        return key in self.held
+
+# recordings (replay.py) and anything driving the game from code (sim.py) give the keys as one byte, a bit per key
+KEY_BITS = {
+    pg.K_LEFT: 1,
+    pg.K_RIGHT: 2,
+    pg.K_SPACE: 4,
+}
+
+def keys_to_bits(keys):
+    bits = 0
+    for key, bit in KEY_BITS.items():
+        if keys[key]:
+            bits |= bit
+    return bits
+
+# the Keys for every possible byte, so we don't make new ones every step
+BITS_TO_KEYS = [Keys(key for key, bit in KEY_BITS.items() if bits & bit) for bits in range(256)]
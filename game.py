@@ -0,0 +1,664 @@
+import pygame as pg
+from settings import *
+from components import Entity, Player, Lava, View, transform_cache, LAYOUT_KEY, ENTITY_TYPES
+from spatial import SpatialHash
+from assets import Fonts, render_text, text_cache, atlases
+from level_compiler import load_level
+from physics import make_bodies
+from cache import LRUCache
+from profiler import profiler
+from controls import BITS_TO_KEYS
+from history import History
+
+# what Game.step says happened to the level
+DIED = 1
+FINISHED = 2
+
+# Where everything was at one point in a level, see Game.snapshot
+# these are kept for every step we can rewind (see history.py) so they only hold what moving entities need to be put
+# back, as compactly as we can: static entities never change so they're left out
+# the entities themselves are kept along with their state, so anything that's gone since (eg. a dead enemy) comes back
+# compiled, level: the level it's in and its number
+# entities: the player, then everything in world, then everything in far chunk by chunk
+# world_size: how many of entities were in world
+# far_sizes: (chunk, how many) for each chunk in far
+# loaded_chunks, active_chunks: which chunks had been streamed in
+# data: what every entity's save_state packed, one after another
+# ground: what the player was standing on (see Player.land)
+# collided: (entity, what was in its collided) for the few entities whose collided wasn't empty
+class Snapshot:
+    __slots__ = (
+        "compiled", "level", "entities", "world_size", "far_sizes", "loaded_chunks", "active_chunks", "data", "ground", "collided",
+    )
+    def __init__(self, compiled, level, entities, world_size, far_sizes, loaded_chunks, active_chunks, data, ground, collided):
+        self.compiled = compiled
+        self.level = level
+        self.entities = entities
+        self.world_size = world_size
+        self.far_sizes = far_sizes
+        self.loaded_chunks = loaded_chunks
+        self.active_chunks = active_chunks
+        self.data = data
+        self.ground = ground
+        self.collided = collided
+
+# Everything about one running game: the level, the entities in it and how to draw them
+# main.py drives it from a window and the keyboard, bench.py drives it headless with scripted input
+class Game:
+    # numpy_physics turns on the vectorized physics in physics.py, if numpy is installed
+    # rewind is how many steps back rewind can go, 0 turns it off so there's no snapshot to take every step
+    def __init__(self, screen, clock, level=1, numpy_physics=NUMPY_PHYSICS, rewind=REWIND_STEPS):
+        self.screen = screen
+        self.clock = clock
+        # backgrounds for each chunk of the level, see draw_chunk
+        self.chunk_backgrounds = LRUCache(CHUNK_CACHE_SIZE)
+        # where the camera is in the world, see move_camera
+        self.camera = (0, 0)
+        # how the world's drawn onto our screen, everything we draw gets this
+        self.view = View()
+        self.resize(*screen.get_size())
+        # these load in the background (see Fonts) so we can start drawing straight away
+        self.fonts = Fonts("sans-serif", {"large": 50, "small": 30})
+
+        self.current_level = None
+        self.world = []
+        self.static = []
+        # static things on screen that still have to be redrawn every frame, like lava
+        self.animated = []
+        self.grid = None
+        self.player = None
+        self.numpy_physics = numpy_physics
+        # the physics arrays for the player and world, or None if every entity does its own physics
+        self.bodies = None
+        self.signs = []
+        self.score_loc = [0,0]
+        self.background = None
+        self.hud = None
+        self.hud_rect = None
+        # whether the background and HUD have their text yet, see draw_background
+        self.text_ready = False
+        # areas of the screen that were drawn over last frame and need to be restored from the background
+        self.drawn = []
+        # milliseconds of real time that haven't been simulated yet (see advance)
+        self.accumulator = 0
+        # a replay.Recording to save every step's keys to, if we're recording
+        self.recorder = None
+        # the profiler's graph, and the frame it's been drawn up to (see draw_profile)
+        self.profile_graph = None
+        self.profile_frame = 0
+        # snapshots of the last rewind steps, see history.py
+        self.history = History(rewind) if rewind else None
+        self.reset(level)
+
+    def reset(self, level):
+        compiled = load_level(level, BRICK_W, BRICK_H)
+        self.player = Player([WIDTH/2, HEIGHT/2], self.screen)
+        self.player.level = level
+        if compiled.player is not None:
+            self.player.rect.topleft = compiled.player
+            # otherwise the first frame would be drawn (and the camera pointed) as if we'd come from the middle of the screen
+            self.player.prev_pos = self.player.rect.topleft
+        if compiled.score is not None:
+            self.score_loc = list(compiled.score)
+        self.signs = compiled.signs
+        # static entities never change, so when we're just respawning in the same level we can keep them
+        # along with their grid and the background
+        keep_static = compiled is self.current_level
+        self.current_level = compiled
+        if not keep_static:
+            # the level geometry that never moves is kept separate
+            # static entities are never updated, and everything else collides with them through a grid of their own
+            # they're built a chunk at a time the first time the camera gets near them (see load_static)
+            self.static = []
+            self.static_grid = SpatialHash(BRICK_W, BRICK_H)
+            # chunks whose static entities have been built, and the entities themselves (as indexes into compiled.entities)
+            # so the ones that cover several chunks are only built once
+            self.static_chunks = set()
+            self.built_static = set()
+            # the level changed, so the background has to be drawn again
+            self.chunk_backgrounds.clear()
+            self.background = None
+        self.world = []
+        # moving entities in chunks too far from the camera to bother updating, keyed by chunk
+        # (not the same as being asleep, see Entity.settle)
+        self.far = {}
+        # chunks whose moving entities have been built
+        # this is never changed in place, only replaced, so snapshots can share it
+        self.loaded_chunks = frozenset()
+        self.active_chunks = None
+        self.bodies = None
+        # the player goes first so it's checked in the same order as before
+        self.grid = SpatialHash(BRICK_W, BRICK_H, [self.player], self.static_grid)
+        self.stream()
+        self.bodies = make_bodies([self.player, *self.world], self.numpy_physics)
+        # where dying puts us back to (see respawn), and the player's time when it was saved
+        self.checkpoint = self.snapshot()
+        self.checkpoint_time = 0
+
+    # where the top left of the camera should be to keep the player (whose top left is at x, y) in the middle of the screen
+    # without going past the edges of the level
+    def camera_position(self, x, y):
+        compiled = self.current_level
+        x = min(max(x+self.player.rect.width/2-WIDTH/2, 0), max(compiled.width-WIDTH, 0))
+        y = min(max(y+self.player.rect.height/2-HEIGHT/2, 0), max(compiled.height-HEIGHT, 0))
+        return x, y
+
+    # the chunks a camera at x would see
+    def chunks_seen(self, x):
+        return int(x//CHUNK_W), int((x+WIDTH-1)//CHUNK_W)
+
+    # build the static entities in chunks that haven't been yet
+    def load_static(self, chunks):
+        compiled = self.current_level
+        new = set()
+        for chunk in chunks:
+            if chunk not in self.static_chunks:
+                self.static_chunks.add(chunk)
+                new.update(compiled.chunks.get(chunk, ()))
+        # in the same order as the level so everything's checked and drawn in the same order no matter which chunk came first
+        for i in sorted(new - self.built_static):
+            char, x, y, w, h = compiled.entities[i]
+            kind = LAYOUT_KEY[char]["type"]
+            if not kind.static:
+                continue
+            self.built_static.add(i)
+            e = kind([x, y], self.screen)
+            if w is not None:
+                e.rect.size = (w, h)
+            self.static.append(e)
+            self.static_grid.add(e)
+
+    # put aside everything in world that isn't in the chunks from first to last
+    def park(self, first, last):
+        left = first*CHUNK_W
+        right = (last+1)*CHUNK_W
+        world = self.world
+        if all(left <= item.rect.x < right for item in world):
+            return
+        grid = self.grid
+        kept = 0
+        for i in range(len(world)):
+            item = world[i]
+            if left <= item.rect.x < right:
+                world[kept] = item
+                kept += 1
+            else:
+                self.far.setdefault(int(item.rect.x//CHUNK_W), []).append(item)
+                grid.remove(item)
+        del world[kept:]
+        if self.bodies is not None:
+            self.bodies = make_bodies([self.player, *world], self.numpy_physics)
+
+    # work out which chunks should be active now that the player's moved
+    # moving things in chunks that aren't active are put aside, ones in chunks that are active again come back
+    # and chunks we haven't been near yet are built
+    def stream(self):
+        first, last = self.chunks_seen(self.camera_position(*self.player.rect.topleft)[0])
+        first -= ACTIVE_CHUNKS
+        last += ACTIVE_CHUNKS
+        # things can wander out of the active chunks on their own, so this has to be checked every step
+        # not just when the player moves to a new chunk
+        self.park(first, last)
+        if (first, last) == self.active_chunks:
+            return
+        self.active_chunks = (first, last)
+        active = range(first, last+1)
+        grid = self.grid
+        world = self.world
+        for chunk in active:
+            for item in self.far.pop(chunk, ()):
+                # it hasn't moved while it was away
+                item.prev_pos = item.rect.topleft
+                world.append(item)
+                grid.add(item)
+        # the level geometry goes one chunk further out than moving things do, so anything in the last active chunk
+        # always has something to collide with until it's put aside at the end of the step
+        self.load_static(range(first-1, last+2))
+        compiled = self.current_level
+        new = set()
+        for chunk in active:
+            if chunk not in self.loaded_chunks:
+                self.loaded_chunks = self.loaded_chunks | {chunk}
+                new.update(compiled.chunks.get(chunk, ()))
+        for i in sorted(new):
+            char, x, y, w, h = compiled.entities[i]
+            kind = LAYOUT_KEY[char]["type"]
+            if kind.static:
+                continue
+            e = kind([x, y], self.screen)
+            if w is not None:
+                e.rect.size = (w, h)
+            world.append(e)
+            grid.add(e)
+        if self.bodies is not None:
+            self.bodies = make_bodies([self.player, *world], self.numpy_physics)
+
+    # the player asked to start the level again or skip it
+    # unlike resets from dying these don't come from anything in the game, so they have to be recorded
+    def restart(self):
+        if self.recorder is not None:
+            self.recorder.restart()
+        self.reset(self.player.level)
+
+    def skip_level(self):
+        if self.recorder is not None:
+            self.recorder.skip_level()
+        self.reset(self.following_level())
+
+    # everything about the level that changes as it's played, to go back to with restore
+    def snapshot(self):
+        player = self.player
+        entities = (player, *self.world, *(item for items in self.far.values() for item in items))
+        return Snapshot(
+            self.current_level, player.level, entities, len(self.world),
+            tuple((chunk, len(items)) for chunk, items in self.far.items()),
+            self.loaded_chunks, self.active_chunks, b"".join([item.save_state() for item in entities]), player.ground,
+            tuple((item, tuple(item.collided)) for item in entities if item.collided),
+        )
+
+    def restore(self, snapshot):
+        if snapshot.compiled is not self.current_level:
+            # we've changed level since, so the static entities have to be built again
+            self.reset(snapshot.level)
+        entities = snapshot.entities
+        self.player = entities[0]
+        end = 1+snapshot.world_size
+        self.world = list(entities[1:end])
+        self.far = {}
+        for chunk, size in snapshot.far_sizes:
+            self.far[chunk] = list(entities[end:end+size])
+            end += size
+        self.loaded_chunks = snapshot.loaded_chunks
+        self.active_chunks = snapshot.active_chunks
+        data = snapshot.data
+        offset = 0
+        for item in entities:
+            offset = item.load_state(data, offset)
+        self.player.ground = snapshot.ground
+        for item, collided in snapshot.collided:
+            item.collided.update(collided)
+        first, last = self.active_chunks
+        self.load_static(range(first-1, last+2))
+        self.grid = SpatialHash(BRICK_W, BRICK_H, [self.player, *self.world], self.static_grid)
+        if self.bodies is not None:
+            self.bodies = make_bodies([self.player, *self.world], self.numpy_physics)
+        self.view.time = self.player.time
+        # everything might be somewhere else now
+        self.background = None
+
+    # after dying we go back to the last checkpoint, which is much quicker than building the level again
+    def respawn(self):
+        self.restore(self.checkpoint)
+
+    # go back one physics step, returns False if we can't go back any further
+    def rewind(self):
+        if self.history is None:
+            return False
+        snapshot = self.history.pop()
+        if snapshot is None:
+            return False
+        if self.recorder is not None:
+            self.recorder.rewind()
+        self.restore(snapshot)
+        # the steps we went back over shouldn't be caught up on
+        self.accumulator = 0
+        return True
+
+    # after the last level we go back to the first
+    def following_level(self):
+        return self.player.level%len(LEVELS)+1
+
+    # one physics step with the player pressing action (a byte made of controls.KEY_BITS)
+    # for when the game's being played by code instead of someone at the keyboard, see sim.py
+    # returns DIED or FINISHED if that ended the level (which has already been reset), otherwise 0
+    def step(self, action):
+        level = self.player.level
+        if not self.update(PHYSICS_STEP, BITS_TO_KEYS[action]):
+            return 0
+        return FINISHED if self.player.level != level else DIED
+
+    # wake up everything asleep in area, or everything if area is None
+    # for when something other than a collision should get things moving again
+    def wake(self, area=None):
+        items = self.world if area is None else self.grid.near(area)
+        for item in items:
+            if item.asleep:
+                item.wake()
+
+    # put new moving entities into the level, eg. for stress testing
+    def add(self, *items):
+        for item in items:
+            self.world.append(item)
+            self.grid.add(item)
+        if self.bodies is not None:
+            self.bodies = make_bodies([self.player, *self.world], self.numpy_physics)
+
+    # the level keeps going exactly where it was, it's just drawn at a different scale (see components.View)
+    # so all we have to do is draw the background again
+    def resize(self, width, height):
+        self.width = width
+        self.height = height
+        self.view.scale_x = width/WIDTH
+        self.view.scale_y = height/HEIGHT
+        self.chunk_backgrounds.clear()
+        # sprites scaled for the old size won't be drawn again, and they'd pile up every time the window's resized
+        atlases.clear()
+        Lava.strips.clear()
+        self.background = None
+
+    # redraw the whole screen next frame, eg. because something else drew over our window
+    def invalidate(self):
+        self.background = None
+
+    # run elapsed milliseconds of real time worth of physics, in fixed PHYSICS_STEP sized steps
+    # leftover time is saved for the next frame
+    # returns how far we are between the last step and the next one (0 to 1) so render can interpolate
+    def advance(self, elapsed, keys=None):
+        self.accumulator += elapsed
+        steps = 0
+        while self.accumulator >= PHYSICS_STEP:
+            if steps == MAX_SUBSTEPS:
+                # we can't keep up, so forget about the time we're behind by
+                # the game slows down for a bit rather than every frame taking longer and longer
+                self.accumulator %= PHYSICS_STEP
+                break
+            self.accumulator -= PHYSICS_STEP
+            steps += 1
+            if self.update(PHYSICS_STEP, keys):
+                # everything was just rebuilt so there's nothing to catch up on
+                self.accumulator = 0
+                break
+        return self.accumulator/PHYSICS_STEP
+
+    # run one physics step, dt is the number of milliseconds it covers
+    # keys is scripted input for the player (see Player.keys), None reads the keyboard
+    # returns True if the level was reset or we respawned, in which case there's nothing new to draw
+    def update(self, dt, keys=None):
+        if self.recorder is not None:
+            self.recorder.record(pg.key.get_pressed() if keys is None else keys)
+        if self.history is not None:
+            self.history.push(self.snapshot())
+        player = self.player
+        awake = self.update_player(dt, keys)
+        if player.remove:
+            self.respawn()
+            return True
+        elif player.next_level:
+            self.reset(self.following_level())
+            return True
+        self.update_world(awake)
+        self.view.time = player.time
+        self.stream()
+        if CHECKPOINT_STEPS and player.on_ground and player.time-self.checkpoint_time >= CHECKPOINT_STEPS*PHYSICS_STEP:
+            self.checkpoint = self.snapshot()
+            self.checkpoint_time = player.time
+        return False
+
+    # the first half of update
+    # returns who was awake when everyone's velocity was worked out at once (see physics.py), otherwise None
+    def update_player(self, dt, keys):
+        player = self.player
+        grid = self.grid
+        player.prev_pos = player.rect.topleft
+        for item in self.world:
+            item.prev_pos = item.rect.topleft
+        player.keys = keys
+        player.update_time(dt)
+        bodies = self.bodies
+        awake = None
+        if bodies is None:
+            player.update(grid)
+        else:
+            # everyone's velocity at once, then each moves and sorts out its collisions one at a time in the usual order
+            awake = bodies.integrate()
+            player.finish_update(grid, bodies.move(0))
+        grid.move(player)
+        return awake
+
+    # the second half of update, awake is what update_player returned
+    def update_world(self, awake):
+        player = self.player
+        grid = self.grid
+        bodies = self.bodies
+        # items we're keeping are moved down over the ones we aren't as we go, so the list never has to be rebuilt
+        world = self.world
+        kept = 0
+        removed = None
+        for i in range(len(world)):
+            item = world[i]
+            # sleeping things haven't moved, so there's nothing to do for them (see Entity.settle)
+            if not item.asleep:
+                # things woken up after everyone's velocity was worked out still have to do all of it themselves
+                if awake is None or not awake[i+1]:
+                    item.update(grid)
+                else:
+                    item.finish_update(grid, bodies.move(i+1))
+                grid.move(item)
+            if not item.remove and type(item) is not Player:
+                world[kept] = item
+                kept += 1
+            elif removed is None:
+                removed = [item]
+            else:
+                removed.append(item)
+        if removed is not None:
+            del world[kept:]
+            # removed items can still be collided with for the rest of the frame, so take them out of the grid afterwards
+            for item in removed:
+                grid.remove(item)
+            if bodies is not None:
+                self.bodies = make_bodies([player, *world], self.numpy_physics)
+
+    # point the camera at the player, alpha of the way between the last physics step and the next like they're drawn
+    # returns True if it moved, in which case everything on screen has moved
+    def move_camera(self, alpha):
+        player = self.player
+        x = player.prev_pos[0]+(player.rect.x-player.prev_pos[0])*min(alpha, 1)
+        y = player.prev_pos[1]+(player.rect.y-player.prev_pos[1])*min(alpha, 1)
+        self.camera = self.camera_position(x, y)
+        view = self.view
+        # the camera goes by whole screen pixels so everything moves by exactly the same amount
+        camera_x, camera_y = view.scale_point(*self.camera)
+        moved = (camera_x, camera_y) != (view.camera_x, view.camera_y)
+        view.camera_x = camera_x
+        view.camera_y = camera_y
+        return moved
+
+    # the part of the level the camera can see
+    def camera_rect(self):
+        return pg.Rect(*self.camera, WIDTH, HEIGHT)
+
+    # everything in one chunk of the level that doesn't change during a level, drawn onto one surface
+    def draw_chunk(self, chunk):
+        compiled = self.current_level
+        view = self.view
+        self.load_static([chunk])
+        left = round(chunk*CHUNK_W*view.scale_x)
+        right = round((chunk+1)*CHUNK_W*view.scale_x)
+        surface = pg.Surface((right-left, max(round(compiled.height*view.scale_y), self.height))).convert()
+        surface.fill(COLORS["background"])
+        # draw everything as if the camera was at the chunk's top left corner, anything outside it just gets cut off
+        camera = (view.camera_x, view.camera_y)
+        view.camera_x = left
+        view.camera_y = 0
+        if self.text_ready:
+            for text, x, y, in self.signs:
+                surface.blit(render_text(self.fonts.get("small"), text, COLORS["sign"]), view.point_to_screen(x, y))
+        for item in self.static_grid.near(pg.Rect(chunk*CHUNK_W, 0, CHUNK_W, compiled.height)):
+            # animated things are drawn fresh every frame instead
+            if not item.animated:
+                item.render(view, surface)
+        view.camera_x, view.camera_y = camera
+        return surface
+
+    # put together the backgrounds of the chunks on screen into one surface
+    # then each frame we only have to copy bits of it back over where things moved, until the camera moves
+    def draw_background(self):
+        view = self.view
+        self.background = pg.Surface(self.screen.get_size()).convert()
+        self.background.fill(COLORS["background"])
+        # if the fonts haven't loaded yet we leave the text out, and draw everything again once they have
+        text_ready = self.fonts.ready()
+        if text_ready != self.text_ready:
+            self.text_ready = text_ready
+            self.chunk_backgrounds.clear()
+        first, last = self.chunks_seen(self.camera[0])
+        for chunk in range(first, last+1):
+            surface = self.chunk_backgrounds.get(chunk, lambda: self.draw_chunk(chunk))
+            self.background.blit(surface, (round(chunk*CHUNK_W*view.scale_x)-view.camera_x, -view.camera_y))
+        self.animated = [item for item in self.static_grid.near(self.camera_rect()) if item.animated]
+        # the level number only changes when we reset, so we only have to render it once
+        # it isn't part of the background because it's drawn on top of anything that moves over it
+        # it stays in the same place on screen wherever the camera is
+        if self.text_ready:
+            self.hud = render_text(self.fonts.get("large"), str(self.player.level), COLORS["score"])
+            self.hud_rect = self.hud.get_rect(topleft=view.scale_point(*self.score_loc))
+        else:
+            self.hud = None
+            self.hud_rect = pg.Rect(view.scale_point(*self.score_loc), (0, 0))
+        self.drawn = []
+
+    # fps and cache stats in the bottom left corner
+    # returns the areas drawn over
+    def draw_debug(self):
+        if not self.fonts.ready():
+            return []
+        asleep = sum(item.asleep for item in self.world)
+        far = sum(len(items) for items in self.far.values())
+        lines = [
+            str(round(self.clock.get_fps())),
+            f"awake {len(self.world)+1-asleep} asleep {asleep} far {far}",
+            f"rewind {0 if self.history is None else len(self.history)} steps",
+            "transforms "+transform_cache.stats(),
+            "text "+text_cache.stats(),
+        ]
+        return [
+            self.screen.blit(render_text(self.fonts.get("small"), line, GRAY), (30, self.height-40-30*i))
+            for i, line in enumerate(lines)
+        ]
+
+    # how long each of the last PROFILE_FRAMES frames took in the top right corner, split up by what it was spent on
+    # each frame is a pixel wide and the line is how long a frame can take without falling behind on physics
+    # returns the area drawn over
+    def draw_profile(self):
+        height = PROFILE_GRAPH_H
+        # pixels per millisecond, so the line's in the middle
+        scale = height/(2*PHYSICS_STEP)
+        if self.profile_graph is None:
+            self.profile_graph = pg.Surface((PROFILE_FRAMES, height)).convert()
+            self.profile_graph.fill(BLACK)
+        graph = self.profile_graph
+        # scroll along one pixel for each frame that's finished since last time
+        self.profile_frame = max(self.profile_frame, profiler.frame-PROFILE_FRAMES)
+        while self.profile_frame < profiler.frame:
+            x = PROFILE_FRAMES-1
+            graph.scroll(-1, 0)
+            graph.fill(BLACK, (x, 0, 1, height))
+            bottom = height
+            for name, ms in profiler.totals[self.profile_frame%PROFILE_FRAMES].items():
+                bar = round(ms*scale)
+                graph.fill(PROFILE_COLORS.get(name, GRAY), (x, bottom-bar, 1, bar))
+                bottom -= bar
+            self.profile_frame += 1
+        left = self.width-PROFILE_FRAMES-10
+        drawn = self.screen.blit(graph, (left, 10))
+        pg.draw.line(self.screen, GRAY, (left, 10+height//2), (left+PROFILE_FRAMES-1, 10+height//2))
+        # which color's which, down the left of the graph
+        if self.fonts.ready():
+            for i, (name, color) in enumerate(PROFILE_COLORS.items()):
+                label = render_text(self.fonts.get("small"), name, color)
+                drawn = drawn.union(self.screen.blit(label, label.get_rect(topright=(left-10, 10+25*i))))
+        return drawn
+
+    # put what's been drawn on the actual screen, rects are the areas that changed or None for all of it
+    def present(self, rects=None):
+        if rects is None:
+            pg.display.flip()
+        else:
+            pg.display.update(rects)
+
+    # alpha is how far we are between the last physics step and the next one, see advance
+    def render(self, alpha=1):
+        screen = self.screen
+        view = self.view
+        moved = self.move_camera(alpha)
+        if DIRTY_RECTS:
+            if not self.text_ready and self.fonts.ready():
+                self.background = None
+            # when the camera moves everything on screen moves with it, so nothing's left to reuse
+            full_redraw = self.background is None or moved
+            if full_redraw:
+                self.draw_background()
+                screen.blit(self.background, (0, 0))
+            # put the background back wherever things were drawn last frame
+            # the HUD is tiny and has to end up on top of everything so it's always redrawn
+            for rect in [*self.drawn, self.hud_rect]:
+                screen.blit(self.background, rect, rect)
+            new_drawn = []
+            for item in self.animated:
+                new_drawn.append(item.render(view))
+            for item in self.world:
+                new_drawn.append(item.render(view, alpha=alpha))
+            new_drawn.append(self.player.render(view, alpha=alpha))
+            new_drawn = [rect for rect in new_drawn if rect is not None]
+
+            ## HUD
+            ### score
+            if self.hud is not None:
+                screen.blit(self.hud, self.hud_rect)
+            ### fps
+            if DEBUG:
+                new_drawn += self.draw_debug()
+            if profiler.enabled:
+                new_drawn.append(self.draw_profile())
+
+            if full_redraw:
+                self.present()
+            else:
+                # the old areas have to be updated too, since that's where things just moved away from
+                self.present([*self.drawn, *new_drawn, self.hud_rect])
+            self.drawn = new_drawn
+        else:
+            screen.fill(COLORS["background"])
+
+            text_ready = self.fonts.ready()
+            ## signs
+            if text_ready:
+                for text, x, y, in self.signs:
+                    screen.blit(render_text(self.fonts.get("small"), text, COLORS["sign"]), view.point_to_screen(x, y))
+
+            for item in self.static_grid.near(self.camera_rect()):
+                item.render(view)
+            for item in self.world:
+                item.render(view, alpha=alpha)
+            self.player.render(view, alpha=alpha)
+
+            ## HUD
+            ### score
+            if text_ready:
+                screen.blit(render_text(self.fonts.get("large"), str(self.player.level), COLORS["score"]), view.scale_point(*self.score_loc))
+            ### fps
+            if DEBUG:
+                self.draw_debug()
+            if profiler.enabled:
+                self.draw_profile()
+
+            self.present()
+
+# what the profiler times when it's on, as (owner, method, name), see profiler.py
+# the top level ones (and the event loop in main.py) are what Game.draw_profile graphs
+PROFILED = [
+    (Game, "update_player", "player"),
+    (Game, "update_world", "world"),
+    (Entity, "handle_collisions", "collisions"),
+    (Game, "render", "render"),
+    *((kind, "render", "render "+kind.__name__) for kind in ENTITY_TYPES),
+    (Game, "present", "flip"),
+]
+# the colors for each top level phase in the graph
+PROFILE_COLORS = {
+    "events": YELLOW,
+    "player": GREEN,
+    "world": BLUE,
+    "render": ORANGE,
+}
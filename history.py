@@ -0,0 +1,36 @@
+# The last few seconds of a level, for rewinding
+# Game.update saves a snapshot (see Game.snapshot) before every physics step into a ring buffer of the last size steps,
+# and Game.rewind takes them back off one at a time, so holding backspace plays the level backwards a step per frame
+# Snapshots only hold what moving entities need to be put back, so a full buffer costs REWIND_STEPS times
+# about 80 bytes per moving entity, however big the level is
+
+class History:
+    def __init__(self, size):
+        self.size = size
+        self.snapshots = [None]*size
+        # how many snapshots have been saved altogether, the next one goes in slot count%size
+        self.count = 0
+        # how many of them we can still go back to
+        self.stored = 0
+
+    def push(self, snapshot):
+        self.snapshots[self.count%self.size] = snapshot
+        self.count += 1
+        if self.stored < self.size:
+            self.stored += 1
+
+    # the newest snapshot, which is taken out so the one before it is next
+    # returns None once we've gone back as far as we can
+    def pop(self):
+        if not self.stored:
+            return None
+        self.count -= 1
+        self.stored -= 1
+        i = self.count%self.size
+        snapshot = self.snapshots[i]
+        # so anything only it was holding on to (eg. an enemy that's been killed since) can be freed
+        self.snapshots[i] = None
+        return snapshot
+
+    def __len__(self):
+        return self.stored
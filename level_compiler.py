@@ -0,0 +1,196 @@
+import hashlib
+import pickle
+import pygame as pg
+from settings import *
+from components import LAYOUT_KEY
+
+# Everything reset() needs to build a level, worked out once from the layout strings
+# entities: (key, x, y, width, height) for every LAYOUT_KEY entity in the order they go in the world list
+#   merged tiles are already merged, non-merging entities have None for width and height since they pick their own size
+# player: where the player starts, or None to leave them in the middle of the screen
+# score: where the level number goes
+# signs: [text, x, y] for each sign
+# width, height: the size of the whole level
+# chunks: {chunk: [index into entities, ...]} for every chunk (see CHUNK_COLUMNS) that has something in it
+#   moving entities are in the chunk their left edge is in, static ones are in every chunk they touch
+class CompiledLevel:
+    def __init__(self, digest, entities, player, score, signs, width, height, chunks):
+        self.digest = digest
+        self.entities = entities
+        self.player = player
+        self.score = score
+        self.signs = signs
+        self.width = width
+        self.height = height
+        self.chunks = chunks
+
+# bump this whenever CompiledLevel changes so saved levels from before get compiled again
+LEVEL_FORMAT = 2
+
+# a hash of everything the compiled level depends on so we can tell if a saved one is out of date
+def level_digest(level, brick_w, brick_h):
+    source = repr((LEVELS[level-1], LEVEL_SIGNS[level-1], brick_w, brick_h, OPTIMAL_MERGE, CHUNK_COLUMNS, LEVEL_FORMAT))
+    return hashlib.sha1(source.encode()).hexdigest()
+
+# The original merge: go through the layout once and grow each tile into the last entity to its left or above it
+# Returns (key, Rect) for every merged entity in the order they go at the start of the world list
+def merge_tiles(LAYOUT, brick_w, brick_h):
+    merged = []
+    columns = [
+        {} for char in LAYOUT[0]
+    ]
+    for y_idx in range(len(LAYOUT)):
+        row = LAYOUT[y_idx]
+        row_ents = {}
+        y = y_idx*brick_h
+        for x_idx in range(len(row)):
+            column = columns[x_idx]
+            x = x_idx*brick_w
+            char = row[x_idx]
+            if char not in LAYOUT_KEY.keys() or not LAYOUT_KEY[char]["merge"]:
+                continue
+            # Merge adjacent bricks so they're single entities
+            # This prevents weird skipping along the floor and walls
+            # We use Rects like the entities do so merging rounds exactly the same way
+            if char in row_ents and row_ents[char][-1].right == x and row_ents[char][-1].height == brick_h:
+                row_ents[char][-1].width += brick_w
+            elif char in column and column[char][-1].bottom == y and column[char][-1].width == brick_w:
+                column[char][-1].height += brick_h
+            else:
+                if char not in column:
+                    column[char] = []
+                if char not in row_ents:
+                    row_ents[char] = []
+                rect = pg.Rect(x, y, brick_w, brick_h)
+                column[char].append(rect)
+                row_ents[char].append(rect)
+                # Merging items are added to the beginning so they're always rendered and updated before everything else
+                # This probably doesn't really matter anymore but I'm keeping it just in case
+                merged.insert(0, (char, rect))
+    return merged
+
+# Cover a set of (column, row) cells with rectangles (column, row, width, height) without overlapping
+# Starting from the top left, each rectangle goes as far right as it can and then as far down as the whole width fits
+# It isn't always the minimum number of rectangles but it's very close for the kind of shapes levels have
+def cover_cells(cells):
+    rects = []
+    covered = set()
+    for cell in sorted(cells, key=lambda cell: (cell[1], cell[0])):
+        if cell in covered:
+            continue
+        x, y = cell
+        w = 1
+        while (x+w, y) in cells and (x+w, y) not in covered:
+            w += 1
+        h = 1
+        while all((i, y+h) in cells and (i, y+h) not in covered for i in range(x, x+w)):
+            h += 1
+        covered.update((i, j) for i in range(x, x+w) for j in range(y, y+h))
+        rects.append((x, y, w, h))
+    return rects
+
+# Merge each kind of tile into as few rectangles as we can, including L shapes and solid blocks
+# which merge_tiles turns into lots of thin strips
+# Returns the same thing as merge_tiles
+def decompose_tiles(LAYOUT, brick_w, brick_h):
+    cells = {}
+    for y_idx, row in enumerate(LAYOUT):
+        for x_idx, char in enumerate(row):
+            if char in LAYOUT_KEY.keys() and LAYOUT_KEY[char]["merge"]:
+                cells.setdefault(char, set()).add((x_idx, y_idx))
+    merged = []
+    for char, tiles in cells.items():
+        # try going across first and going down first and keep whichever needs fewer rectangles
+        across = cover_cells(tiles)
+        down = [(x, y, w, h) for y, x, h, w in cover_cells({(y, x) for x, y in tiles})]
+        for x, y, w, h in min(across, down, key=len):
+            # work out each edge separately so neighbouring tiles line up exactly even if the brick size isn't a whole number
+            left = int(x*brick_w)
+            top = int(y*brick_h)
+            merged.append((char, pg.Rect(left, top, int((x+w)*brick_w)-left, int((y+h)*brick_h)-top)))
+    # top to bottom, left to right, then reversed like merge_tiles does
+    merged.sort(key=lambda item: (item[1].top, item[1].left), reverse=True)
+    return merged
+
+def compile_level(level, brick_w, brick_h, optimal=None):
+    if optimal is None:
+        optimal = OPTIMAL_MERGE
+    LAYOUT = LEVELS[level-1]
+    if optimal:
+        entities = decompose_tiles(LAYOUT, brick_w, brick_h)
+    else:
+        entities = merge_tiles(LAYOUT, brick_w, brick_h)
+    player = None
+    score = None
+    signs = []
+    for y_idx in range(len(LAYOUT)):
+        row = LAYOUT[y_idx]
+        y = y_idx*brick_h
+        for x_idx in range(len(row)):
+            x = x_idx*brick_w
+            char = row[x_idx]
+            if char in LAYOUT_KEY.keys():
+                if not LAYOUT_KEY[char]["merge"]:
+                    entities.append((char, (x, y)))
+            elif char == LAYOUT_KEY["player"]:
+                player = (x, y)
+            elif char == LAYOUT_KEY["score"]:
+                score = (x, y)
+            elif char == LAYOUT_KEY["sign"]:
+                signs.append([LEVEL_SIGNS[level-1][len(signs)], x, y])
+    # flatten the rects now that merging is done so the whole thing is plain data that can be pickled
+    entities = [
+        (char, *tuple(spot)) if len(spot) == 4 else (char, *spot, None, None)
+        for char, spot in entities
+    ]
+    chunk_w = CHUNK_COLUMNS*brick_w
+    chunks = {}
+    for i, (char, x, y, w, h) in enumerate(entities):
+        first = last = int(x//chunk_w)
+        if w is not None and LAYOUT_KEY[char]["type"].static:
+            last = int((x+w-1)//chunk_w)
+        for chunk in range(first, last+1):
+            chunks.setdefault(chunk, []).append(i)
+    width = max(len(row) for row in LAYOUT)*brick_w
+    height = len(LAYOUT)*brick_h
+    return CompiledLevel(level_digest(level, brick_w, brick_h), entities, player, score, signs, width, height, chunks)
+
+# compiled levels keyed by (level, brick_w, brick_h)
+# the brick size comes from the window size so this is really per level and window size
+compiled_levels = {}
+loaded_file = False
+
+def load_level(level, brick_w, brick_h):
+    global loaded_file
+    if LEVEL_CACHE_FILE is not None and not loaded_file:
+        loaded_file = True
+        try:
+            with open(LEVEL_CACHE_FILE, "rb") as f:
+                saved = pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError, AttributeError):
+            # no cache yet (or a broken one), we'll just compile everything again
+            saved = {}
+        # throw away anything compiled from an older version of the level
+        for key, compiled in saved.items():
+            if key[0] <= len(LEVELS) and compiled.digest == level_digest(*key):
+                compiled_levels[key] = compiled
+    key = (level, brick_w, brick_h)
+    compiled = compiled_levels.get(key)
+    if compiled is None:
+        compiled = compile_level(level, brick_w, brick_h)
+        compiled_levels[key] = compiled
+        if LEVEL_CACHE_FILE is not None:
+            with open(LEVEL_CACHE_FILE, "wb") as f:
+                pickle.dump(compiled_levels, f)
+    return compiled
+
+# how many entities each level has with the old merge and the new one
+def merge_report():
+    print("level  merge_tiles  decompose_tiles")
+    for level in range(1, len(LEVELS)+1):
+        before = len(compile_level(level, BRICK_W, BRICK_H, optimal=False).entities)
+        after = len(compile_level(level, BRICK_W, BRICK_H, optimal=True).entities)
+        print(f"{level:>5}  {before:>11}  {after:>15}")
+
+if __name__ == "__main__":
+    merge_report()
@@ -0,0 +1,75 @@
+from settings import *
+
+# numpy is optional, without it every entity just does its own physics
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Physics for every moving entity at once
+# vel, acc and mass for all of them live in one array each (one row per entity) and the entities' own vel and acc
+# are views of their rows, so all the per-entity code (collisions, keys, friction) keeps working on them as before
+# gravity and working out everyone's new velocity is then one numpy step instead of a python loop
+# moving is still done one entity at a time (see move), right before it sorts out its own collisions, so everything
+# is moved and collided in the same order as without numpy, eg. the player standing on a falling box lands on where
+# the box ended up rather than where it was going
+class Bodies:
+    def __init__(self, entities):
+        self.entities = list(entities)
+        count = len(self.entities)
+        self.vel = np.zeros((count, 2))
+        self.acc = np.zeros((count, 2))
+        self.mass = np.array([e.mass for e in self.entities], dtype=float)
+        self.falls = np.array([e.falls for e in self.entities], dtype=float)
+        for i, e in enumerate(self.entities):
+            self.vel[i] = e.vel
+            self.acc[i] = e.acc
+            e.vel = self.vel[i]
+            e.acc = self.acc[i]
+            e.body = i
+
+    # before_physics for everyone awake, then the vectorized first half of Entity.integrate, everything but moving
+    # returns whether each entity was awake for it, in the same order as entities, anyone asleep is left alone
+    def integrate(self):
+        vel = self.vel
+        acc = self.acc
+        awake = np.array([not e.asleep for e in self.entities])
+        # where everyone started the step, see take_back
+        self.start_vel = vel.copy()
+        self.start_acc = acc.copy()
+        for e, moving in zip(self.entities, awake):
+            if moving:
+                e.before_physics()
+                e.ahead = self
+            else:
+                e.ahead = None
+        # sleeping entities have no velocity, so keeping gravity off them is enough to keep them still
+        acc[:, 1] += np.where(vel[:, 1] < 0, GRAVITY_JUMPING, GRAVITY)*self.mass*self.falls*awake
+        vel += acc*(1/self.mass)[:, None]
+        np.minimum(vel[:, 1], TERMINAL_VEL, out=vel[:, 1])
+        return awake.tolist()
+
+    # something that moved before e this step is about to run into it
+    # without numpy e wouldn't have done anything yet, so put it back how it started and let it do it all itself in move
+    # that runs its before_physics again, which is fine since everyone's only changes vel and acc except the player's,
+    # and the player always goes first
+    def take_back(self, e):
+        i = e.body
+        e.vel[:] = self.start_vel[i]
+        e.acc[:] = self.start_acc[i]
+        e.ahead = None
+
+    # the second half of Entity.integrate for entity i, returning where it started
+    def move(self, i):
+        e = self.entities[i]
+        if e.ahead is None:
+            e.before_physics()
+            return e.integrate()
+        e.ahead = None
+        return e.move()
+
+# Bodies for entities if we can, otherwise None
+def make_bodies(entities, enabled=NUMPY_PHYSICS):
+    if not enabled or np is None:
+        return None
+    return Bodies(entities)
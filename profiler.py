@@ -0,0 +1,133 @@
+# Timing where each frame goes, for finding out what's slow while actually playing
+# When it's turned on (PROFILE, main.py --profile, or p in game) the methods in game.PROFILED are swapped for timed
+# versions, and when it's off they're swapped back, so the timers don't cost anything at all until they're wanted
+# Every timed call ends up in a ring buffer of the last PROFILE_SPANS calls, which t saves as a Chrome trace
+# (open it at chrome://tracing or ui.perfetto.dev), and Game.draw_profile graphs the last PROFILE_FRAMES frames
+import json
+import time
+from settings import *
+
+perf_counter = time.perf_counter
+
+class Scope:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+    def __enter__(self):
+        self.start = perf_counter()
+        self.profiler.depth += 1
+    def __exit__(self, *exc):
+        profiler = self.profiler
+        profiler.depth -= 1
+        if profiler.enabled:
+            profiler.add(self.name, self.start, perf_counter(), profiler.depth)
+
+class Profiler:
+    def __init__(self, size=PROFILE_SPANS, frames=PROFILE_FRAMES):
+        self.enabled = False
+        # the ring buffer, one slot per timed call
+        self.size = size
+        self.names = [None]*size
+        self.starts = [0.0]*size
+        self.ends = [0.0]*size
+        # how many timed calls this one was inside of
+        self.depths = [0]*size
+        self.frame_numbers = [0]*size
+        # how many calls have been timed altogether, the next one goes in slot count%size
+        self.count = 0
+        self.depth = 0
+        self.frame = 0
+        self.frame_start = perf_counter()
+        # milliseconds spent in each top level phase ({name: ms}) for each of the last frames frames
+        self.frames = frames
+        self.totals = [{} for _ in range(frames)]
+        # (owner, attribute, what it was before we swapped it) for everything enable swapped
+        self.patched = []
+
+    def add(self, name, start, end, depth):
+        i = self.count%self.size
+        self.names[i] = name
+        self.starts[i] = start
+        self.ends[i] = end
+        self.depths[i] = depth
+        self.frame_numbers[i] = self.frame
+        self.count += 1
+        if depth == 0:
+            totals = self.totals[self.frame%self.frames]
+            totals[name] = totals.get(name, 0)+(end-start)*1000
+
+    # time a with block, for things that happen once a frame like the event loop
+    # these cost a little even when we're off, so anything that happens a lot should go in game.PROFILED instead
+    def scope(self, name):
+        return Scope(self, name)
+
+    # call at the end of every frame
+    def next_frame(self):
+        now = perf_counter()
+        if self.enabled:
+            # frames go around everything else
+            self.add("frame", self.frame_start, now, -1)
+        self.frame_start = now
+        self.frame += 1
+        self.totals[self.frame%self.frames] = {}
+
+    # swap owner.attribute for a version of original that times itself as name
+    def wrap(self, owner, attribute, name, original):
+        profiler = self
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            profiler.depth += 1
+            try:
+                return original(*args, **kwargs)
+            finally:
+                profiler.depth -= 1
+                profiler.add(name, start, perf_counter(), profiler.depth)
+        # it might have come from a parent class, in which case we just have to delete ours to put it back
+        self.patched.append((owner, attribute, owner.__dict__.get(attribute)))
+        setattr(owner, attribute, timed)
+
+    # targets is [(owner, attribute, name), ...], see game.PROFILED
+    def enable(self, targets):
+        if self.enabled:
+            return
+        self.enabled = True
+        # get everything before swapping anything, otherwise a subclass would get its parent's timed version
+        # and be timed twice
+        originals = [getattr(owner, attribute) for owner, attribute, name in targets]
+        for (owner, attribute, name), original in zip(targets, originals):
+            self.wrap(owner, attribute, name, original)
+
+    def disable(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        for owner, attribute, original in reversed(self.patched):
+            if original is None:
+                delattr(owner, attribute)
+            else:
+                setattr(owner, attribute, original)
+        self.patched = []
+
+    # everything in the ring buffer in Chrome's trace event format
+    # returns how many calls were saved
+    def save_trace(self, path):
+        first = max(self.count-self.size, 0)
+        events = []
+        # calls are added when they finish, so the first one in the buffer isn't necessarily the first to start
+        origin = min((self.starts[n%self.size] for n in range(first, self.count)), default=0)
+        for n in range(first, self.count):
+            i = n%self.size
+            events.append({
+                "name": self.names[i],
+                "ph": "X",
+                "ts": (self.starts[i]-origin)*1e6,
+                "dur": (self.ends[i]-self.starts[i])*1e6,
+                "pid": 1,
+                "tid": 1,
+                "args": {"frame": self.frame_numbers[i]},
+            })
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
+profiler = Profiler()
@@ -0,0 +1,146 @@
+# Recording what the player pressed and playing it back exactly
+# Physics only ever moves in fixed PHYSICS_STEP steps (see Game.advance), so the same keys on the same steps
+# always end up in exactly the same place no matter how fast the game was running
+# Record a session with
+#   python main.py --record session.rec
+# and play it back headless, as fast as possible, checking everything ends up where it did when it was recorded
+#   python replay.py session.rec
+#   python replay.py session.rec --render --repeat 5
+import os
+import argparse
+import struct
+import sys
+import time
+import zlib
+import pygame as pg
+from settings import *
+from game import Game
+from controls import keys_to_bits, BITS_TO_KEYS
+
+# each step is stored as one byte, with a bit for each key that was held (see controls.KEY_BITS)
+# and a bit each for the player restarting the level or skipping it just before the step (see Game.restart)
+# a byte with REWIND set is the player going back a step (see Game.rewind) rather than a step
+# and one with NO_STEP set only restarts or skips the level, for when that was the last thing they did before quitting
+RESTART = 8
+SKIP_LEVEL = 16
+REWIND = 32
+NO_STEP = 64
+
+# a file is a header, then every step's byte compressed with zlib (keys are mostly held for a while so it compresses well)
+# the header is: magic, format version, starting level, seed, number of steps, checksum of where everything ended up
+MAGIC = b"PREC"
+FORMAT = 2
+HEADER = struct.Struct("<4sHHIII")
+
+# a crc32 of where the player and everything in the world are and how fast they're going
+# two runs only get the same one if they ended up in exactly the same state
+def checksum(game):
+    player = game.player
+    crc = zlib.crc32(struct.pack("<H4i2d", player.level, *player.rect, *player.vel))
+    for item in game.world:
+        crc = zlib.crc32(struct.pack("<4i2d", *item.rect, *item.vel), crc)
+    return crc
+
+class Recording:
+    # seed is for anything random that went into the run (eg. bench.py's stress entities), main.py always uses 0
+    def __init__(self, level, seed=0, steps=None, checksum=None):
+        self.level = level
+        self.seed = seed
+        self.steps = bytearray() if steps is None else steps
+        self.checksum = checksum
+        # RESTART and SKIP_LEVEL bits waiting for the next step
+        self.pending = 0
+
+    # Game.update calls this every step while we're recording
+    def record(self, keys):
+        self.steps.append(keys_to_bits(keys) | self.pending)
+        self.pending = 0
+
+    def restart(self):
+        self.pending |= RESTART
+
+    def skip_level(self):
+        self.pending |= SKIP_LEVEL
+
+    def rewind(self):
+        self.steps.append(REWIND | self.pending)
+        self.pending = 0
+
+    # game is the game we recorded, the checksum of where it ended up is saved so playback can check it gets there too
+    def save(self, path, game):
+        # a restart or skip that hasn't had a step after it yet has already happened to game, so it has to be saved too
+        if self.pending:
+            self.steps.append(NO_STEP | self.pending)
+            self.pending = 0
+        self.checksum = checksum(game)
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, FORMAT, self.level, self.seed, len(self.steps), self.checksum))
+            f.write(zlib.compress(bytes(self.steps)))
+
+def load_recording(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, level, seed, count, crc = HEADER.unpack_from(data)
+    if magic != MAGIC or version != FORMAT:
+        raise ValueError(f"{path} isn't a recording this version of the game can play")
+    steps = zlib.decompress(data[HEADER.size:])
+    if len(steps) != count:
+        raise ValueError(f"{path} should have {count} steps but has {len(steps)}")
+    return Recording(level, seed, steps, crc)
+
+# run every step of recording through game, drawing each one if render is set
+# returns whether everything ended up where it did when it was recorded
+def play(game, recording, render=False):
+    game.reset(recording.level)
+    for bits in recording.steps:
+        if bits & RESTART:
+            game.restart()
+        if bits & SKIP_LEVEL:
+            game.skip_level()
+        if bits & NO_STEP:
+            continue
+        if bits & REWIND:
+            game.rewind()
+            if render:
+                game.render()
+            continue
+        was_reset = game.update(PHYSICS_STEP, BITS_TO_KEYS[bits])
+        if render and not was_reset:
+            game.render()
+    return checksum(game) == recording.checksum
+
+def main():
+    parser = argparse.ArgumentParser(description="Play back a recording from main.py --record as fast as possible")
+    parser.add_argument("recording")
+    parser.add_argument("--render", action="store_true", help="draw every step too, not just the physics")
+    parser.add_argument("--repeat", type=int, default=1, help="play it this many times and report the fastest")
+    args = parser.parse_args()
+    recording = load_recording(args.recording)
+
+    # no window, and no waiting for one
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pg.display.init()
+    pg.font.init()
+    screen = pg.display.set_mode((WIDTH, HEIGHT))
+    game = Game(screen, pg.time.Clock(), recording.level)
+    game.fonts.wait()
+    times = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        matched = play(game, recording, args.render)
+        times.append(time.perf_counter()-start)
+        if not matched:
+            break
+    pg.quit()
+
+    steps = len(recording.steps)
+    best = min(times)
+    print(f"level {recording.level}, {steps} steps in {best*1000:.1f} ms: {steps/best:.0f} steps/s, {steps*PHYSICS_STEP/1000/best:.1f}x real time")
+    if matched:
+        print("checksum ok")
+    else:
+        print(f"checksum mismatch: recorded {recording.checksum:08x}, got {checksum(game):08x}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
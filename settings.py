@@ -1,6 +1,9 @@
 import pygame as pg
 
 DEBUG = False
+# draw the level into a cached background once and only redraw (and update) the parts of the screen that change
+# turn this off to go back to redrawing everything and flipping the whole display every frame
+DIRTY_RECTS = True
 
 WHITE = pg.Color(255,255,255)
 BLACK = pg.Color(0,0,0)
@@ -48,24 +51,61 @@ SPRITES = {
     "lava": "lava.png",
     "gold": "coin_gold.png",
 }
-import sys
 from pathlib import Path
-dir = Path(sys.argv[0]).parent
+# the sprites are only loaded once something needs them (see assets.py)
+SPRITE_DIR = Path(Path(__file__).parent, "sprites")
 for name in SPRITES:
     # automatically turn single sprites into single-item lists
     # that way every entity has a list of animation frames even if they never change appearance
     if type(SPRITES[name]) is not list:
         SPRITES[name] = [SPRITES[name]]
-    for i, path in enumerate(SPRITES[name]):
-        full_path = Path(dir, "sprites", path)
-        SPRITES[name][i] = pg.image.load(full_path)
 
 WIDTH = 800
 HEIGHT = 500
 INITIAL_WIDTH  = WIDTH
 INITIAL_HEIGHT = HEIGHT
 
+# how often we draw (0 means as fast as we can)
 FPS = 60
+# physics always steps at PHYSICS_FPS no matter how fast we're drawing, so the game plays the same at any frame rate
+PHYSICS_FPS = 60
+# milliseconds per physics step
+PHYSICS_STEP = 1000/PHYSICS_FPS
+# the most physics steps we'll run in one frame
+# if we're so far behind that we need more than this, we skip ahead instead of trying to catch up
+# otherwise slow frames mean more steps, which mean even slower frames...
+MAX_SUBSTEPS = 5
+# do gravity and movement for every moving entity at once with numpy (see physics.py)
+# it only pays off with lots of entities, and without numpy installed this does nothing
+NUMPY_PHYSICS = False
+# moving things that have sat still for SLEEP_FRAMES steps (moving less than SLEEP_VEL) stop being updated
+# until something runs into them, see Entity.settle
+SLEEPING = True
+SLEEP_FRAMES = 30
+SLEEP_VEL = 0.05
+# hold backspace to rewind, up to this many physics steps back (see history.py), 0 turns rewinding off
+REWIND_STEPS = 600
+# dying puts the player back at their last checkpoint (see Game.respawn), and the start of the level is always one
+# set this to also save one whenever the player's standing on something and it's been this many physics steps
+# since the last one (0 means only ever the start of the level)
+CHECKPOINT_STEPS = 0
+
+# how many flipped/stretched sprites to keep around so we don't make new ones every frame
+TRANSFORM_CACHE_SIZE = 256
+# how many rendered bits of text (signs, the HUD, the debug overlay) to keep around
+TEXT_CACHE_SIZE = 64
+# the stretch of falling sprites is rounded to this so similar speeds share the same stretched sprite
+SQUASH_STEP = 0.05
+
+# time what each frame is spent on (see profiler.py), this can also be turned on with main.py --profile or p in game
+PROFILE = False
+# how many timed calls to keep for saving as a trace
+PROFILE_SPANS = 32768
+# how many frames the graph shows, and how tall it is
+PROFILE_FRAMES = 240
+PROFILE_GRAPH_H = 100
+# where t saves the trace
+TRACE_FILE = "trace.json"
 
 # friction on the ground when not accelerating
 GROUND_FRICT = 0.3
@@ -98,43 +138,17 @@ from levels import *
 BRICK_W = WIDTH/len(LEVELS[0][0])
 BRICK_H = HEIGHT/len(LEVELS[0])
 
-# we have to wait until now to import the components so that the necessary constants are declared
-# before the circular import
-from components import GrassBrick, Brick, Enemy, Box, Lava, Goal, SlidingBrick, SlidingBrickBouncer
-LAYOUT_KEY = {
-    "player": "@",
-    "score": "U",
-    "sign": "S",
-    "#": {
-        "type": GrassBrick,
-        "merge": True
-    },
-    "H": {
-        "type": Brick,
-        "merge": True
-    },
-    "*": {
-        "type": Lava,
-        "merge": True
-    },
-    "-": {
-        "type": SlidingBrick,
-        "merge": True
-    },
-    "|": {
-        "type": SlidingBrickBouncer,
-        "merge": False
-    },
-    "^": {
-        "type": Enemy,
-        "merge": False
-    },
-    "=": {
-        "type": Box,
-        "merge": False
-    },
-    "O": {
-        "type": Goal,
-        "merge": False
-    }
-}
\ No newline at end of file
+# levels can be wider (or taller) than the screen, in which case the camera follows the player
+# they're split into chunks this many bricks wide, and only the chunks on screen and ACTIVE_CHUNKS either side of them
+# are updated; moving things further away than that sleep until the player comes back
+CHUNK_COLUMNS = 16
+CHUNK_W = CHUNK_COLUMNS*BRICK_W
+ACTIVE_CHUNKS = 1
+# how many chunks of background to keep drawn
+CHUNK_CACHE_SIZE = 16
+
+# merge tiles into as few rectangles as possible instead of just rows and columns
+# run level_compiler.py to see how many entities each level ends up with either way
+OPTIMAL_MERGE = True
+# set this to a file name to save compiled levels between runs (see level_compiler.py)
+LEVEL_CACHE_FILE = None
@@ -0,0 +1,190 @@
+# Lots of games at once with no screen, for automated playtesting
+# Each game is a plain Game (see Game.step) and they're spread over worker processes which step them all at once.
+# Observations, actions and what happened are all in one block of shared memory, so stepping only costs
+# one tiny message each way per worker, however many games it has
+#   with VectorGame(256, level=3) as games:
+#       observations = games.reset()
+#       while ...:
+#           observations, events = games.step(actions)
+# actions is one byte of controls.KEY_BITS per game, and games that die or finish start the level again straight away
+# Run it on its own to see how many steps a second a machine can do
+#   python sim.py --games 512 --workers 16 --steps 2000
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+import argparse
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+import numpy as np
+import pygame as pg
+from settings import *
+from game import Game, DIED, FINISHED
+
+# what each game's row of observations holds
+OBSERVATION = ("level", "x", "y", "vel_x", "vel_y", "on_ground")
+
+# a new game that never draws anything
+# nothing's going to rewind it, so it doesn't spend time saving a snapshot every step
+def headless_game(level):
+    return Game(pg.Surface((WIDTH, HEIGHT)), None, level, rewind=0)
+
+def observe(game, out):
+    player = game.player
+    out[0] = player.level
+    out[1] = player.rect.x
+    out[2] = player.rect.y
+    out[3] = player.vel[0]
+    out[4] = player.vel[1]
+    out[5] = player.on_ground
+
+# the observations, actions and events arrays for count games, on top of buffer
+def shared_arrays(buffer, count):
+    observations = np.ndarray((count, len(OBSERVATION)), np.float32, buffer)
+    offset = observations.nbytes
+    actions = np.ndarray(count, np.uint8, buffer, offset)
+    events = np.ndarray(count, np.uint8, buffer, offset+count)
+    return observations, actions, events
+
+def shared_size(count):
+    return count*len(OBSERVATION)*4+2*count
+
+# The games from first up to last (out of count), with their arrays on buffer (see shared_arrays)
+class Worker:
+    def __init__(self, buffer, count, first, last, level):
+        self.observations, self.actions, self.events = shared_arrays(buffer, count)
+        self.first = first
+        self.level = level
+        self.games = [headless_game(level) for _ in range(first, last)]
+
+    def reset(self):
+        for i, game in enumerate(self.games, self.first):
+            game.reset(self.level)
+            self.events[i] = 0
+            observe(game, self.observations[i])
+
+    def step(self):
+        observations = self.observations
+        actions = self.actions
+        events = self.events
+        for i, game in enumerate(self.games, self.first):
+            event = game.step(actions[i])
+            # every game plays the same level over and over, so go back to it if we just finished
+            if event == FINISHED:
+                game.reset(self.level)
+            events[i] = event
+            observe(game, observations[i])
+
+def run_worker(connection, name, count, first, last, level):
+    memory = shared_memory.SharedMemory(name)
+    worker = Worker(memory.buf, count, first, last, level)
+    while True:
+        command = connection.recv()
+        if command == "step":
+            worker.step()
+        elif command == "reset":
+            worker.reset()
+        else:
+            break
+        connection.send(None)
+    # the arrays have to go before the memory they're in can be closed
+    del worker
+    memory.close()
+
+class VectorGame:
+    # workers=0 runs every game in this process, which is easier to debug
+    def __init__(self, count, workers=None, level=1):
+        if workers is None:
+            workers = os.cpu_count()
+        workers = min(workers, count)
+        self.count = count
+        self.memory = shared_memory.SharedMemory(create=True, size=shared_size(count))
+        self.observations, self.actions, self.events = shared_arrays(self.memory.buf, count)
+        self.local = None
+        self.connections = []
+        self.processes = []
+        if workers == 0:
+            self.local = Worker(self.memory.buf, count, 0, count, level)
+            return
+        # fork where we can so the workers don't have to import everything again
+        if "fork" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("fork")
+        else:
+            context = multiprocessing.get_context()
+        for w in range(workers):
+            ours, theirs = context.Pipe()
+            process = context.Process(
+                target=run_worker,
+                args=(theirs, self.memory.name, count, count*w//workers, count*(w+1)//workers, level),
+                daemon=True,
+            )
+            process.start()
+            self.connections.append(ours)
+            self.processes.append(process)
+
+    def command(self, command):
+        if self.local is not None:
+            getattr(self.local, command)()
+            return
+        for connection in self.connections:
+            connection.send(command)
+        for connection in self.connections:
+            connection.recv()
+
+    # start every game at the beginning of the level again
+    # returns the observations (see OBSERVATION), one row per game
+    def reset(self):
+        self.command("reset")
+        return self.observations
+
+    # one physics step of every game, actions is a byte of controls.KEY_BITS for each
+    # returns (observations, events), events being DIED, FINISHED or 0 for each game
+    # both are the shared arrays, so they change on the next step, copy them if you want to keep them
+    def step(self, actions):
+        self.actions[:] = actions
+        self.command("step")
+        return self.observations, self.events
+
+    def close(self):
+        if self.memory is None:
+            return
+        for connection in self.connections:
+            connection.send("close")
+        for process in self.processes:
+            process.join()
+        self.local = None
+        del self.observations, self.actions, self.events
+        self.memory.close()
+        self.memory.unlink()
+        self.memory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Step lots of headless games with random input and report how fast it goes")
+    parser.add_argument("--games", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per cpu, 0 runs everything here)")
+    parser.add_argument("--steps", type=int, default=1000, help="steps to run every game for")
+    parser.add_argument("--level", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0, help="seed for the random input")
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+    with VectorGame(args.games, args.workers, args.level) as games:
+        games.reset()
+        died = 0
+        finished = 0
+        start = time.perf_counter()
+        for _ in range(args.steps):
+            observations, events = games.step(rng.integers(0, 8, args.games, dtype=np.uint8))
+            died += np.count_nonzero(events == DIED)
+            finished += np.count_nonzero(events == FINISHED)
+        elapsed = time.perf_counter()-start
+    steps = args.games*args.steps
+    print(f"{steps} steps in {elapsed:.2f} s: {steps/elapsed:.0f} steps/s ({died} died, {finished} finished)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import math
+
+# A uniform grid over the level, one cell per brick
+# Every item is filed under each cell its rect touches, so collision checks only need to look at
+# the items in the cells around an entity instead of the whole world
+# It still behaves like the old world list (iterating, indexing, len) so nothing else has to care
+# static is another SpatialHash holding the level geometry that never moves
+# it's built once per level and near() checks it before our own (moving) items
+class SpatialHash:
+    def __init__(self, cell_w, cell_h, items=(), static=None):
+        self.cell_w = cell_w
+        self.cell_h = cell_h
+        self.static = static
+        self.clear()
+        for item in items:
+            self.add(item)
+
+    def clear(self):
+        self.cells = {}
+        self.items = []
+        # item -> (position in items, cells it's filed under)
+        # the position is how we return nearby items in the same order as the world list
+        self.entries = {}
+        self.next_order = 0
+
+    def __iter__(self):
+        return iter(self.items)
+    def __len__(self):
+        return len(self.items)
+    def __getitem__(self, i):
+        return self.items[i]
+
+    def cells_for(self, rect):
+        # right and bottom are exclusive, so a rect that only touches a cell's edge isn't filed under it
+        # (touching rects never collide anyway since their intersection is empty)
+        x0 = math.floor(rect.left/self.cell_w)
+        x1 = math.floor((rect.right-1)/self.cell_w)
+        y0 = math.floor(rect.top/self.cell_h)
+        y1 = math.floor((rect.bottom-1)/self.cell_h)
+        return [(x, y) for x in range(x0, x1+1) for y in range(y0, y1+1)]
+
+    def add(self, item):
+        cells = self.cells_for(item.rect)
+        for cell in cells:
+            self.cells.setdefault(cell, []).append(item)
+        self.entries[item] = (self.next_order, cells)
+        self.next_order += 1
+        self.items.append(item)
+
+    def remove(self, item):
+        order, cells = self.entries.pop(item)
+        for cell in cells:
+            self.cells[cell].remove(item)
+        self.items.remove(item)
+
+    # call this whenever an item's rect changes so it's filed under the right cells
+    def move(self, item):
+        order, old_cells = self.entries[item]
+        cells = self.cells_for(item.rect)
+        if cells == old_cells:
+            return
+        for cell in old_cells:
+            self.cells[cell].remove(item)
+        for cell in cells:
+            self.cells.setdefault(cell, []).append(item)
+        self.entries[item] = (order, cells)
+
+    # every item filed under a cell that rect touches, in the order they were added
+    def near(self, rect):
+        return self.near_cells(self.cells_for(rect))
+
+    def near_cells(self, cells):
+        nearby = []
+        if self.static is not None:
+            # the static layer uses the same cell size so we can pass the cells straight through
+            nearby = self.static.near_cells(cells)
+        # for really big rects (like a merged floor) it's cheaper to just check everything
+        if len(cells) > len(self.items):
+            return [*nearby, *self.items]
+        found = set()
+        for cell in cells:
+            found.update(self.cells.get(cell, ()))
+        return [*nearby, *sorted(found, key=lambda item: self.entries[item][0])]